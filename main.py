@@ -3,8 +3,15 @@ import time
 import logging
 import yfinance as yf
 from src.utils import load_presets, save_preset, delete_preset
-from src.data_provider import fetch_ticker_data
-from src.components_html import get_card_styles, render_ticker_card
+from bisect import bisect_left
+from src.scanner import iter_scan, DEFAULT_MAX_WORKERS
+from src.cache import get_default_cache
+from src.fetcher import default_rate, set_fetch_rate
+from src.data_provider import ZONE_STATUSES
+from src.components_html import get_card_styles, render_card_grid, card_table, classify_result, CATEGORY_LABELS, CARD_SORTS, PAGE_SIZES
+from src.metrics import ScanMetrics, COUNTER_LABELS
+from src.commentary import comment_results
+from src.prescan import start_prescan_worker, last_prescan
 
 # =============================================================================
 # SEKCHJA 1: KONFIGURACJA I STYLE
@@ -28,7 +35,8 @@ st.markdown('''
         padding-left: 5rem !important;
         padding-right: 5rem !important;
     }
-    [data-testid="stMarkdownContainer"] > div {
+    /* Siatka kart ma własny układ - flex tylko dla pojedynczych bloków HTML */
+    [data-testid="stMarkdownContainer"] > div:not(.fibo-grid) {
         display: flex !important;
         justify-content: center !important;
         width: 100% !important;
@@ -39,6 +47,8 @@ st.markdown('''
 if 'last_cost' not in st.session_state: st.session_state.last_cost = 0.0
 if 'total_cost' not in st.session_state: st.session_state.total_cost = 0.0
 
+DEFAULT_PAGE_SIZE = 24
+
 # =============================================================================
 # SEKCHJA 2: LOGIKA POMOCNICZA UI
 # =============================================================================
@@ -53,11 +63,151 @@ def update_fields():
         st.session_state.input_name = ''
         st.session_state.input_tickers = ''
 
+def render_counters(placeholder, counts):
+    with placeholder.container():
+        for col, (key, label) in zip(st.columns(len(CATEGORY_LABELS)), CATEGORY_LABELS.items()):
+            col.metric(label, counts[key])
+
+def render_costs(placeholder):
+    with placeholder.container():
+        c_cost1, c_cost2 = st.columns(2)
+        c_cost1.metric('Ostatni', f'${st.session_state.last_cost:.4f}')
+        c_cost2.metric('Suma', f'${st.session_state.total_cost:.4f}')
+
+def add_commentary(results, tickers, cost_slot):
+    '''Komentarze AI do kart: z cache za darmo, brakujące paczkami; koszt tylko za nowe zapytania.'''
+    if not st.session_state.get('ai_commentary') or not tickers: return {}
+    with st.spinner('🤖 Komentarze AI...'):
+        run = comment_results({t: results[t] for t in tickers}, st.session_state.api_key)
+    st.session_state.last_cost = run.cost
+    st.session_state.total_cost += run.cost
+    render_costs(cost_slot)
+    if run.failed: st.warning(f"🤖 **Brak komentarza AI:** {', '.join(run.failed)}" + (f' ({run.errors[0]})' if run.errors else ''))
+    return run.texts
+
+def render_summaries(groups):
+    '''Zbiorcze raporty pod kartami.'''
+    if groups['fetch_error']:
+        st.warning(f"🌐 **Nie udało się pobrać danych (spróbuj ponownie):** {', '.join(groups['fetch_error'])}")
+    if groups['rejected']:
+        st.warning(f"📉 **Trend spadkowy (SMA200 D1/W1):** {', '.join(groups['rejected'])}")
+    if groups['no_zone']:
+        st.info(f"🔍 **Brak stref Fibo poniżej ceny:** {', '.join(groups['no_zone'])}")
+    if groups['low_prob']:
+        st.info(f"⚖️ **Zbyt niskie prawdopodobieństwo:** {', '.join(groups['low_prob'])}")
+    if groups['filtered']:
+        st.info(f"🚫 **Poza wybranymi statusami stref:** {', '.join(groups['filtered'])}")
+    for message in groups['error']:
+        st.error(message)
+
+def run_streaming_scan(tickers, period, interval, cost_slot, refresh=False):
+    '''W trakcie skanu podgląd pierwszej strony kart (wg siły strefy) jako jeden blok HTML; pełny widok po zakończeniu.'''
+    tickers = list(dict.fromkeys(tickers))
+    progress = st.progress(0.0, text='Skanowanie i weryfikacja trendu...')
+    counters = st.empty()
+    preview = st.empty()
+
+    counts = {key: 0 for key in CATEGORY_LABELS}
+    card_scores, top_cards, card_tickers = [], [], []
+    results = {}
+    per_page = st.session_state.get('cards_per_page', DEFAULT_PAGE_SIZE)
+    metrics = ScanMetrics(label=f'{len(tickers)} tickerów · {period} · {interval}')
+    start = time.time()
+    render_counters(counters, counts)
+
+    set_fetch_rate(st.session_state.fetch_rate)
+    scan = iter_scan(tickers, period=period, interval=interval, max_workers=st.session_state.max_workers, refresh=refresh, metrics=metrics)
+    for done, (t, result) in enumerate(scan, 1):
+        with metrics.timer('render', t):
+            results[t] = result
+            kind, payload, score = classify_result(t, result, interval, st.session_state.min_prob, st.session_state.status_filter)
+            counts[kind] += 1
+            if kind == 'card':
+                card_tickers.append(t)
+                # Malejąco wg siły; podgląd wysyłany ponownie tylko, gdy karta trafia na pierwszą stronę
+                pos = bisect_left(card_scores, -score)
+                card_scores.insert(pos, -score)
+                if pos < per_page:
+                    top_cards.insert(pos, payload)
+                    del top_cards[per_page:]
+                    preview.markdown(render_card_grid(top_cards), unsafe_allow_html=True)
+
+            elapsed = time.time() - start
+            eta = elapsed / done * (len(tickers) - done)
+            progress.progress(done / len(tickers), text=f'Przeskanowano {done}/{len(tickers)} · {elapsed:.0f}s · ETA {eta:.0f}s')
+            render_counters(counters, counts)
+
+    elapsed = time.time() - start
+    with metrics.timer('commentary'):
+        commentary = add_commentary(results, card_tickers, cost_slot)
+    for placeholder in (progress, counters, preview):
+        placeholder.empty()
+    return {'results': results, 'period': period, 'interval': interval, 'time': time.strftime('%H:%M:%S'), 'elapsed': elapsed, 'metrics': metrics.finish(), 'commentary': commentary}
+
+def render_page_controls(n_cards):
+    '''Widok, sortowanie i strona; zwraca (widok, klucz sortowania, wycinek kart).'''
+    c_view, c_sort, c_size, c_page = st.columns([2, 2, 1, 1])
+    view = c_view.radio('Widok', ['Karty', 'Tabela'], horizontal=True, key='result_view')
+    sort = c_sort.selectbox('Sortuj wg', list(CARD_SORTS), key='card_sort')
+    per_page = c_size.selectbox('Na stronę', PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key='cards_per_page')
+    n_pages = max(1, -(-n_cards // per_page))
+    # Mniej kart po zmianie filtrów - strona poza zakresem wraca na ostatnią
+    if st.session_state.get('card_page', 1) > n_pages: st.session_state.card_page = n_pages
+    page = c_page.number_input('Strona', min_value=1, max_value=n_pages, key='card_page', disabled=view == 'Tabela')
+    return view, sort, slice((page - 1) * per_page, page * per_page)
+
+def render_scan_view(scan):
+    '''Wyniki z pamięci: filtry, sortowanie i strony bez pobierania danych; do przeglądarki trafia tylko bieżąca strona kart.'''
+    groups = {key: [] for key in CATEGORY_LABELS}
+    commentary = dict(scan.get('commentary') or {})
+    # Karty odsłonięte zmianą filtrów: tylko komentarze z cache, bez nowych kosztów
+    if st.session_state.get('ai_commentary'): commentary.update(comment_results(scan['results'], cached_only=True).texts)
+    for t, result in scan['results'].items():
+        kind, payload, _ = classify_result(t, result, scan['interval'], st.session_state.min_prob, st.session_state.status_filter, scan['time'], commentary)
+        groups[kind].append(payload)
+
+    elapsed = f", {scan['elapsed']:.1f}s" if scan.get('elapsed') is not None else ''
+    st.caption(f"Skan z {scan['time']} ({scan['period']}, {scan['interval']}{elapsed}) · zmiana filtrów nie pobiera danych ponownie")
+    render_counters(st.empty(), {key: len(items) for key, items in groups.items()})
+    st.divider()
+    if groups['card']:
+        view, sort, page = render_page_controls(len(groups['card']))
+        cards = sorted(groups['card'], key=CARD_SORTS[sort])
+        if view == 'Tabela':
+            st.dataframe(card_table(cards), hide_index=True, width='stretch')
+        else:
+            st.markdown(render_card_grid(cards[page]), unsafe_allow_html=True)
+            st.caption(f'Karty {page.start + 1}-{min(page.stop, len(cards))} z {len(cards)}')
+        st.divider()
+    render_summaries(groups)
+
+def render_metrics_panel(metrics):
+    '''Sidebar: czasy etapów ostatniego skanu, liczniki cache/sieci i najwolniejsze tickery.'''
+    with st.sidebar.expander('⏱️ Wydajność skanu'):
+        st.caption(f'{metrics.label} · {metrics.wall:.1f}s')
+        counters = {label: str(metrics.counters[key]) for key, label in COUNTER_LABELS.items() if key != 'bytes_downloaded'}
+        counters['Pobrane dane'] = f"{metrics.counters['bytes_downloaded'] / 2 ** 20:.2f} MB"
+        st.dataframe({'Licznik': list(counters), 'Wartość': list(counters.values())}, hide_index=True, width='stretch')
+
+        stages = metrics.stage_table()
+        stages['share'] = (stages['share'] * 100).round(1)
+        st.dataframe(stages.drop(columns='stage').rename(columns={'label': 'Etap', 'calls': 'Wywołania', 'total_s': 'Suma [s]', 'mean_ms': 'Śr. [ms]', 'max_ms': 'Max [ms]', 'share': '% skanu'}), hide_index=True, width='stretch')
+
+        st.markdown('**Najwolniejsze tickery [s]**')
+        st.dataframe(metrics.slowest_tickers(), hide_index=True, width='stretch')
+        ticker = st.selectbox('Ticker', sorted(metrics.tickers), index=None, placeholder='Rozbicie dla tickera...')
+        if ticker: st.dataframe({'Etap': list(metrics.tickers[ticker]), 'Czas [ms]': [round(v * 1000, 2) for v in metrics.tickers[ticker].values()]}, hide_index=True, width='stretch')
+
+        col_j, col_p = st.columns(2)
+        col_j.download_button('JSON', metrics.to_json(), file_name='scan_metrics.json', mime='application/json', width='stretch')
+        col_p.download_button('Prometheus', metrics.to_prometheus(), file_name='scan_metrics.prom', mime='text/plain', width='stretch')
+
 # =============================================================================
 # SEKCHJA 3: GŁÓWNA APLIKACJA
 # =============================================================================
 
 def main():
+    start_prescan_worker()
     if 'input_name' not in st.session_state: st.session_state.input_name = ''
     if 'input_tickers' not in st.session_state: st.session_state.input_tickers = ''
 
@@ -68,10 +218,9 @@ def main():
     with st.sidebar:
         st.markdown('### 🔑 Konfiguracja i Koszty')
         st.text_input('OpenAI API Key', type='password', key='api_key')
-        
-        c_cost1, c_cost2 = st.columns(2)
-        c_cost1.metric('Ostatni', f'${st.session_state.last_cost:.4f}')
-        c_cost2.metric('Suma', f'${st.session_state.total_cost:.4f}')
+        st.toggle('🤖 Komentarz AI do kart', value=False, key='ai_commentary', help='Komentarze zapisywane w cache - niezmienione tickery nic nie kosztują')
+        cost_slot = st.empty()
+        render_costs(cost_slot)
         
         st.divider()
         tab_presets, tab_params = st.tabs(['📁 Presety', '⚙️ Parametry'])
@@ -91,79 +240,32 @@ def main():
             period = st.selectbox('Zakres danych', ['1y', '2y', '5y', 'max'], index=2)
             interval = st.radio('Interwał', ['1d', '1wk'], horizontal=True)
             st.slider('Min. Prob (%)', 0.0, 1.0, 0.55, step=0.01, key='min_prob')
+            st.multiselect('Status strefy', ZONE_STATUSES, default=ZONE_STATUSES, key='status_filter')
+            st.slider('Równoległe pobieranie', 1, 32, DEFAULT_MAX_WORKERS, key='max_workers')
+            st.number_input('Limit zapytań/s', 0.5, 50.0, min(default_rate(), 50.0), step=0.5, key='fetch_rate', help='Wspólny dla wszystkich wątków pobierania; przy błędach 429 zmniejsz')
+            st.button('🧹 Wyczyść cache danych', width='stretch', on_click=lambda: get_default_cache().invalidate())
+            prescan = last_prescan()
+            if prescan: st.caption(f"🌙 Pre-skan: {prescan['finished_at']} ({prescan['tickers']} tickerów, świeże do {prescan['fresh_until']})")
 
         st.divider()
         start_scan = st.button('🚀 URUCHOM SKANER', width='stretch')
+        rescan = st.button('🔄 Wymuś ponowny skan', width='stretch', help='Pomija zapamiętane wyniki i dociąga najnowsze słupki')
 
     # --- LOGIKA SKANERA ---
-    if start_scan:
+    if start_scan or rescan:
         tickers = [t.strip().upper() for t in st.session_state.input_tickers.replace('\n', ',').split(',') if t.strip()]
         if not tickers:
             st.error('Podaj symbole!')
             return
 
-        with st.spinner('Skanowanie i weryfikacja trendu...'):
-            results = {t: fetch_ticker_data(t, period=period, interval=interval) for t in tickers}
-            
-        st.divider()
+        st.session_state.scan = run_streaming_scan(tickers, period, interval, cost_slot, refresh=rescan)
 
-        no_zones = []
-        low_prob = []
-
-        # 1. NAJPIERW: Wyświetlanie kart dla zaakceptowanych spółek
-        for t, (symbol, df) in results.items():
-            if df is not None:
-                struct = df.attrs.get('structure')
-                if struct:
-                    try:
-                        last_price = float(df['Close'].iloc[-1])
-                        clusters = struct.get('clusters', [])
-                        active_zones = [z for z in clusters if z['avg_price'] < last_price]
-                        main_zone = active_zones[0] if active_zones else None
-                        
-                        if main_zone:
-                            prob_pct = main_zone['total_score'] * 10
-                            
-                            if (prob_pct / 100.0) >= st.session_state.min_prob:
-                                card_data = {
-                                    'ticker': t,
-                                    'timestamp': time.strftime('%H:%M:%S'),
-                                    'prob': prob_pct, 
-                                    'strength': main_zone['total_score'],
-                                    'price': last_price,
-                                    'interval_short': interval,
-                                    'n_samples': len(df),
-                                    'fibo': main_zone['avg_price'],
-                                    'label_low': 'Dół Strefy',
-                                    'fibo_low': main_zone['min_price'],
-                                    'label_high': 'Góra Strefy',
-                                    'fibo_high': main_zone['max_price'],
-                                    'ai_desc': struct.get('signals', [])
-                                }
-                                st.markdown(render_ticker_card(card_data), unsafe_allow_html=True)
-                            else:
-                                low_prob.append(f"{t} ({prob_pct:.0f}%)")
-                        else:
-                            no_zones.append(t)
-                            
-                    except Exception as e:
-                        st.error(f"Błąd renderowania {t}: {e}")
-
-        # 2. NA KONIEC: Zbiorcze raporty pod kartami
-        st.divider()
-        
-        rejected = [t for t, res in results.items() if res[1] is None]
-        if rejected:
-            st.warning(f"📉 **Trend spadkowy (SMA200 D1/W1):** {', '.join(rejected)}")
-        
-        if no_zones:
-            st.info(f"🔍 **Brak stref Fibo poniżej ceny:** {', '.join(no_zones)}")
-            
-        if low_prob:
-            st.info(f"⚖️ **Zbyt niskie prawdopodobieństwo:** {', '.join(low_prob)}")
-            
+    if st.session_state.get('scan'):
+        render_scan_view(st.session_state.scan)
     else:
         st.info('Wybierz spółki i uruchom skaner.')
 
+    if st.session_state.get('scan', {}).get('metrics'): render_metrics_panel(st.session_state.scan['metrics'])
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
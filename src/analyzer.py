@@ -0,0 +1,253 @@
+from bisect import bisect_left
+import pandas as pd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# =============================================================================
+# SEKCHJA 1: LOGIKA FIBONACCIEGO I KLASTRÓW (EPIC 1)
+# =============================================================================
+
+# Nazwa poziomu: (współczynnik zniesienia, waga); >1.0 = rozszerzenia poniżej dołka
+FIB_RATIOS = {
+    '38.2%': (0.382, 1.0),
+    '50.0%': (0.500, 1.2),
+    '61.8%': (0.618, 1.5),
+    '78.6%': (0.786, 1.5)
+}
+CLUSTER_TOLERANCE = 0.0050
+ZONE_TOLERANCE = 0.012
+
+def get_fib_levels(start_price, end_price, start_date, ratios=FIB_RATIOS):
+    '''Wylicza poziomy Fibo dla konkretnego impulsu z wagami.'''
+    diff = end_price - start_price
+    return {name: {'price': end_price - diff * ratio, 'date': start_date, 'weight': weight} for name, (ratio, weight) in ratios.items()}
+
+def _segment_sums(values, bounds):
+    '''Sumy segmentów [start, end) dodawane po kolei (ten sam wynik co sum() w Pythonie).'''
+    starts, lengths = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+    total = np.zeros(len(bounds))
+    for offset in range(int(lengths.max(initial=0))):
+        active = offset < lengths
+        total[active] += values[starts[active] + offset]
+    return total
+
+def _greedy_groups(values, tol):
+    '''Granice [start, end) grup: element dołącza, dopóki (v - v_start) / v_start < tol.'''
+    values = values.tolist()
+    bounds = []
+    i, n = 0, len(values)
+    while i < n:
+        j = bisect_left(values, values[i] * (1 + tol), i + 1)
+        # Korekta granicy, aby decydowała dokładnie ta sama formuła względna
+        while j < n and (values[j] - values[i]) / values[i] < tol: j += 1
+        while j > i + 1 and not (values[j - 1] - values[i]) / values[i] < tol: j -= 1
+        bounds.append((i, j))
+        i = j
+    return np.array(bounds, dtype=np.int64).reshape(-1, 2)
+
+class ZoneSet:
+    '''Klastry i strefy Fibo w tablicach równoległych; poziomy wskazują HL po indeksie, słowniki budowane na żądanie.'''
+    __slots__ = ('hl_price', 'hl_date', 'ratio_names', 'price', 'score', 'ratio_idx', 'hl_idx', 'cluster_bounds', 'zone_clusters', 'zones')
+
+    def __init__(self, hl_price, hl_date, ratio_names, price, score, ratio_idx, hl_idx, cluster_bounds, zone_clusters, zones):
+        self.hl_price, self.hl_date = hl_price, hl_date
+        self.ratio_names = ratio_names
+        self.price, self.score, self.ratio_idx, self.hl_idx = price, score, ratio_idx, hl_idx
+        self.cluster_bounds = cluster_bounds
+        self.zone_clusters = zone_clusters
+        self.zones = zones
+
+    def __len__(self):
+        return len(self.zones['avg_price'])
+
+    @property
+    def n_hls(self):
+        return len(self.hl_price)
+
+    def first_below(self, price):
+        '''Indeks najsilniejszej strefy ze środkiem poniżej ceny (lub None).'''
+        below = np.flatnonzero(self.zones['avg_price'] < price)
+        return int(below[0]) if below.size else None
+
+    def _level_dict(self, k):
+        h = self.hl_idx[k]
+        return {
+            'price': float(self.price[k]),
+            'from_hl': float(self.hl_price[h]),
+            'date': self.hl_date[h],
+            'type': self.ratio_names[self.ratio_idx[k]],
+            'score': float(self.score[k])
+        }
+
+    def levels(self, z):
+        '''Poziomy strefy `z`: w klastrach wg daty, w strefie wg ceny.'''
+        c_start, c_end = self.zone_clusters[z]
+        members = []
+        for l_start, l_end in self.cluster_bounds[c_start:c_end]:
+            members += sorted((self._level_dict(k) for k in range(l_start, l_end)), key=lambda x: x['date'])
+        return sorted(members, key=lambda x: x['price'])
+
+    def level_types(self, z):
+        '''Nazwy poziomów strefy `z` bez budowania słowników.'''
+        c_start, c_end = self.zone_clusters[z]
+        return {self.ratio_names[r] for l_start, l_end in self.cluster_bounds[c_start:c_end] for r in self.ratio_idx[l_start:l_end]}
+
+    def zone(self, z, with_levels=False):
+        zone = {
+            'avg_price': float(self.zones['avg_price'][z]),
+            'min_price': float(self.zones['min_price'][z]),
+            'max_price': float(self.zones['max_price'][z]),
+            'total_score': float(self.zones['total_score'][z]),
+            'total_count': int(self.zones['total_count'][z])
+        }
+        if with_levels: zone['levels'] = self.levels(z)
+        return zone
+
+    def to_dicts(self, with_levels=True):
+        '''Lista stref jak w find_clusters; `with_levels` = True/False lub indeksy stref do zbudowania.'''
+        if with_levels is True: with_levels = range(len(self))
+        with_levels = set(with_levels or ())
+        return [self.zone(z, z in with_levels) for z in range(len(self))]
+
+def cluster_levels(structure, ratios=FIB_RATIOS, cluster_tol=CLUSTER_TOLERANCE, zone_tol=ZONE_TOLERANCE):
+    '''Szuka klastrów i agreguje poziomy w strefy (tablice posortowane + granice searchsorted).'''
+    hls = structure['hls']
+    names = tuple(ratios)
+    coefs = np.array([ratios[name][0] for name in names], dtype=float)
+    weights = np.array([ratios[name][1] for name in names], dtype=float)
+    hl_price = np.array([hl['price'] for hl in hls], dtype=float)
+    hl_score = np.array([hl.get('score', 1.0) for hl in hls], dtype=float)
+    hh_price = structure['hh']['price']
+
+    # Macierz HL x poziom, spłaszczona w kolejności HL (stabilne sortowanie = kolejność list)
+    price = (hh_price - np.outer(hh_price - hl_price, coefs)).ravel()
+    score = np.outer(hl_score, weights).ravel()
+    hl_idx = np.repeat(np.arange(len(hls), dtype=np.int16), len(names))
+    ratio_idx = np.tile(np.arange(len(names), dtype=np.int8), len(hls))
+    hl_date = pd.DatetimeIndex([hl['date'] for hl in hls])
+
+    keep = price > 0
+    order = np.argsort(price[keep], kind='stable')
+    price, score = price[keep][order], score[keep][order]
+    hl_idx, ratio_idx = hl_idx[keep][order], ratio_idx[keep][order]
+
+    groups = _greedy_groups(price, cluster_tol)
+    cluster_bounds = groups[groups[:, 1] - groups[:, 0] >= 2]
+    empty = {key: np.array([]) for key in ('avg_price', 'min_price', 'max_price', 'total_score', 'total_count')}
+    if len(cluster_bounds) == 0:
+        return ZoneSet(hl_price, hl_date, names, price, score, ratio_idx, hl_idx, cluster_bounds, np.empty((0, 2), dtype=np.int64), empty)
+
+    starts, ends = cluster_bounds[:, 0], cluster_bounds[:, 1]
+    c_count = ends - starts
+    c_avg = _segment_sums(price, cluster_bounds) / c_count
+    c_score = _segment_sums(score, cluster_bounds)
+
+    # Klastry są już uporządkowane wg średniej ceny - łączenie w strefy tą samą metodą
+    zone_clusters = _greedy_groups(c_avg, zone_tol)
+    z_starts = zone_clusters[:, 0]
+    z_min = price[starts[z_starts]]
+    z_max = price[ends[zone_clusters[:, 1] - 1] - 1]
+    z_score = _segment_sums(c_score, zone_clusters)
+    z_count = np.add.reduceat(c_count, z_starts)
+
+    rank = np.argsort(-z_score, kind='stable')
+    zones = {
+        'avg_price': ((z_min + z_max) / 2)[rank],
+        'min_price': z_min[rank],
+        'max_price': z_max[rank],
+        'total_score': z_score[rank],
+        'total_count': z_count[rank]
+    }
+    return ZoneSet(hl_price, hl_date, names, price, score, ratio_idx, hl_idx, cluster_bounds, zone_clusters[rank], zones)
+
+def find_clusters(structure, ratios=FIB_RATIOS, cluster_tol=CLUSTER_TOLERANCE, zone_tol=ZONE_TOLERANCE):
+    '''Szuka klastrów i agreguje poziomy w strefy.'''
+    return cluster_levels(structure, ratios, cluster_tol, zone_tol).to_dicts()
+
+# =============================================================================
+# SEKCHJA 2: ANALIZA STRUKTURY I WYCKOFF EFFORT
+# =============================================================================
+
+HH_WINDOW = 252
+SEARCH_WINDOW = 252
+SWING_HALF_WINDOW = 8
+RECENT_HIGH_WINDOW = 15
+FUTURE_WINDOW = 35
+MA_WINDOW = 20
+
+def _rolling_mean(values, window=MA_WINDOW):
+    return pd.Series(values).rolling(window).mean().to_numpy()
+
+def structure_span(df, hh_window=HH_WINDOW, search_window=SEARCH_WINDOW):
+    '''Pozycja HH i zakres słupków [start, end), od których zależy wynik find_all_significant_lows.'''
+    high = df['High'].to_numpy(dtype=float)
+    hh_pos = len(df) - hh_window + int(np.nanargmax(high[-hh_window:]))
+    search_start = max(0, hh_pos - search_window)
+    # Średnie 20-słupkowe sięgają przed pierwszego kandydata, okno dołka 8 słupków za ostatniego
+    start = max(0, search_start + SWING_HALF_WINDOW - (MA_WINDOW - 1))
+    end = min(len(df), hh_pos - 5 + SWING_HALF_WINDOW)
+    return hh_pos, start, end
+
+def find_all_significant_lows(df, hh_window=HH_WINDOW, search_window=SEARCH_WINDOW):
+    '''Szukanie dołków z analizą Wyckoffa i resetem struktury (wektorowo na tablicach NumPy).'''
+    if df is None or len(df) < hh_window: return None
+    
+    low = df['Low'].to_numpy(dtype=float)
+    high = df['High'].to_numpy(dtype=float)
+    volume = df['Volume'].to_numpy(dtype=float)
+    price_range = high - low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        effort = volume / np.where(price_range == 0, np.nan, price_range)
+    vol_ma = _rolling_mean(volume)
+    eff_ma = _rolling_mean(effort)
+
+    n = len(df)
+    hh_pos = n - hh_window + int(np.nanargmax(high[-hh_window:]))
+    hh_val = float(high[hh_pos])
+    hh_idx = df.index[hh_pos]
+    
+    search_start = max(0, hh_pos - search_window)
+    idx = np.arange(search_start + SWING_HALF_WINDOW, hh_pos - 5)
+    if idx.size == 0: return None
+
+    # NaN pomijane jak w min()/max() pandas: +inf dla minimów, -inf dla maksimów
+    low_f = np.where(np.isnan(low), np.inf, low)
+    high_f = np.where(np.isnan(high), -np.inf, high)
+    width = 2 * SWING_HALF_WINDOW + 1
+
+    # Centralne minimum 17 słupków (okno obcięte na końcu danych jak iloc)
+    low_pad = np.concatenate([low_f, np.full(SWING_HALF_WINDOW, np.inf)])
+    swing_min = sliding_window_view(low_pad, width)[idx - SWING_HALF_WINDOW].min(axis=1)
+    is_swing = low[idx] == swing_min
+
+    v_score = 1.0 + (volume[idx] > vol_ma[idx] * 1.5) + (effort[idx] > eff_ma[idx] * 2.0)
+
+    # Maksimum 15 słupków przed dołkiem (brak pełnego okna = NaN, porównanie zawsze fałszywe)
+    recent_high = np.full(idx.size, np.nan)
+    has_recent = idx >= RECENT_HIGH_WINDOW
+    if has_recent.any():
+        recent = sliding_window_view(high_f, RECENT_HIGH_WINDOW)[idx[has_recent] - RECENT_HIGH_WINDOW].max(axis=1)
+        recent_high[has_recent] = np.where(np.isneginf(recent), np.nan, recent)
+
+    # Maksimum 35 słupków po dołku, ucięte na szczycie HH
+    high_pad = np.concatenate([high_f[:hh_pos], np.full(FUTURE_WINDOW - 1, -np.inf)])
+    future_high = sliding_window_view(high_pad, FUTURE_WINDOW)[idx].max(axis=1)
+
+    low_sel = low[idx]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rebound = (future_high > recent_high) | ((future_high - low_sel) / low_sel > 0.09)
+    selected = np.flatnonzero(is_swing & rebound)
+    candidates = [{'date': df.index[idx[k]], 'price': float(low_sel[k]), 'score': float(v_score[k])} for k in selected]
+
+    if not candidates: return None
+
+    final_hls = []
+    for c in sorted(candidates, key=lambda x: x['date']):
+        final_hls = [h for h in final_hls if h['price'] < c['price']]
+        if not final_hls or (c['date'] - final_hls[-1]['date']).days > 20:
+            final_hls.append(c)
+        else:
+            if c['price'] < final_hls[-1]['price']: final_hls[-1] = c
+
+    significant_lows = [l for l in final_hls if (hh_val - l['price']) / l['price'] >= 0.10]
+    return {'hh': {'date': hh_idx, 'price': hh_val}, 'hls': significant_lows}
@@ -0,0 +1,198 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from src.analyzer import HH_WINDOW
+from src.providers import set_provider
+from src.fetcher import set_fetch_rate
+from src.cli import resolve_universe, write_table, OUTPUT_FORMATS
+from src.data_provider import resample_ohlcv, WEEKLY_SMA_BARS
+from src.indicators import SMA_WINDOW
+from src.scanner import iter_downloads, DEFAULT_MAX_WORKERS, DEFAULT_BATCH_SIZE
+from src.structure_state import incremental_structure
+
+FORWARD_HORIZONS = (5, 10, 20)
+TOUCH_HORIZON = 20
+PROB_BUCKETS = [0, 30, 50, 70, np.inf]
+BARS_PER_YEAR = 252
+
+# =============================================================================
+# SEKCHJA 1: FILTRY TRENDU BEZ ZAGLĄDANIA W PRZYSZŁOŚĆ
+# =============================================================================
+
+def causal_trend_filters(df):
+    '''FA-21/FA-44 dla każdego dnia tylko z danych do tego dnia (bieżący tydzień = niepełny słupek).'''
+    close = df['Close'].to_numpy(dtype=float)
+    sma200 = df['Close'].rolling(SMA_WINDOW).mean().to_numpy()
+    with np.errstate(invalid='ignore'):
+        daily_ok = close >= sma200
+
+    # Tygodniowa SMA200: 199 zamkniętych tygodni + bieżące zamknięcie dnia
+    weekly = resample_ohlcv(df, '1wk')
+    week_start = (df.index.normalize() - pd.to_timedelta(df.index.dayofweek, unit='D'))
+    week_pos = weekly.index.get_indexer(week_start)
+    prefix = np.concatenate([[0.0], np.cumsum(weekly['Close'].to_numpy(dtype=float))])
+    lookback = WEEKLY_SMA_BARS - 1
+    enough = week_pos >= lookback
+    prior = prefix[week_pos] - prefix[np.clip(week_pos - lookback, 0, None)]
+    w_sma = (prior + close) / WEEKLY_SMA_BARS
+    with np.errstate(invalid='ignore'):
+        weekly_ok = ~enough | (close >= w_sma)
+    return daily_ok & weekly_ok
+
+# =============================================================================
+# SEKCHJA 2: REPLAY JEDNEGO TICKERA
+# =============================================================================
+
+def zone_outcomes(df, steps, zone_min, zone_max, horizon=TOUCH_HORIZON):
+    '''Dotknięcie strefy, utrzymanie (brak zamknięcia pod strefą) i stopy zwrotu po sygnale.'''
+    low = df['Low'].to_numpy(dtype=float)
+    close = df['Close'].to_numpy(dtype=float)
+    n = len(df)
+    pad_low = np.concatenate([low[1:], np.full(horizon, np.nan)])
+    pad_close = np.concatenate([close[1:], np.full(horizon, np.nan)])
+    future_low = sliding_window_view(pad_low, horizon)[steps]
+    future_close = sliding_window_view(pad_close, horizon)[steps]
+    complete = steps + horizon < n
+
+    with np.errstate(invalid='ignore'):
+        touch = future_low <= zone_max[:, None]
+        touched = touch.any(axis=1)
+        first_touch = np.where(touched, touch.argmax(axis=1) + 1, -1)
+        # Zamknięcie poniżej dołu strefy po pierwszym dotknięciu = strefa nie wytrzymała
+        after_touch = np.arange(horizon)[None, :] >= (first_touch - 1)[:, None]
+        broken = (after_touch & (future_close < zone_min[:, None])).any(axis=1)
+
+    out = {
+        'touched': np.where(complete | touched, touched, np.nan),
+        'held': np.where(complete, touched & ~broken, np.nan),
+        'bars_to_touch': np.where(touched, first_touch, np.nan)
+    }
+    for h in FORWARD_HORIZONS:
+        ahead = steps + h
+        out[f'fwd_ret_{h}'] = np.where(ahead < n, close[np.minimum(ahead, n - 1)] / close[steps] - 1, np.nan)
+    return out
+
+def walk_structures(df, steps):
+    '''(t, struktura, ZoneSet) dla kolejnych kroków; stan przechodzi między krokami - pełne przeliczenie tylko po zmianie HH.'''
+    state = None
+    for t in steps:
+        struct, zone_set, state = incremental_structure(df.iloc[:t + 1], state)
+        yield t, struct, zone_set
+
+def backtest_ticker(ticker, df, years=5, step=1, horizon=TOUCH_HORIZON):
+    '''Krok po kroku: struktura i strefy z danych do dnia t, wynik z dni t+1..t+horizon.'''
+    n = len(df)
+    first = max(HH_WINDOW, n - int(years * BARS_PER_YEAR))
+    trend_ok = causal_trend_filters(df)
+    close = df['Close'].to_numpy(dtype=float)
+
+    rows = {'step': [], 'zone_avg': [], 'zone_min': [], 'zone_max': [], 'score': []}
+    for t, _, zone_set in walk_structures(df, [t for t in range(first, n, step) if trend_ok[t]]):
+        if zone_set is None: continue
+        z = zone_set.first_below(close[t])
+        if z is None: continue
+        rows['step'].append(t)
+        rows['zone_avg'].append(zone_set.zones['avg_price'][z])
+        rows['zone_min'].append(zone_set.zones['min_price'][z])
+        rows['zone_max'].append(zone_set.zones['max_price'][z])
+        rows['score'].append(zone_set.zones['total_score'][z])
+
+    steps = np.array(rows.pop('step'), dtype=np.int64)
+    events = pd.DataFrame({k: np.asarray(v, dtype=float) for k, v in rows.items()})
+    events.insert(0, 'date', df.index[steps])
+    events.insert(0, 'ticker', ticker)
+    events['close'] = close[steps]
+    events['prob'] = events['score'] * 10
+    events['dist_pct'] = (events['close'] - events['zone_avg']) / events['close'] * 100
+    if len(steps):
+        for name, values in zone_outcomes(df, steps, events['zone_min'].to_numpy(), events['zone_max'].to_numpy(), horizon).items():
+            events[name] = values
+    return events
+
+# =============================================================================
+# SEKCHJA 3: UNIWERSUM RÓWNOLEGLE I PODSUMOWANIE
+# =============================================================================
+
+def run_backtest(tickers, period='max', years=5, step=1, horizon=TOUCH_HORIZON, workers=None, download_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, failed=None):
+    '''Dane pobierane wsadowo w procesie głównym, replay tickerów w puli procesów; `failed` <- {ticker: przyczyna}.'''
+    parts, errors, futures = [], {}, {}
+    failed = failed if failed is not None else {}
+    max_in_flight = 2 * (workers or os.cpu_count() or 1)
+
+    def collect(finished):
+        for future in finished:
+            ticker = futures.pop(future)
+            try:
+                parts.append(future.result())
+            except Exception as e:
+                failed[ticker] = f'{type(e).__name__}: {e}'
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for frames in iter_downloads(tickers, period, '1d', download_workers, batch_size, errors=errors):
+            for t, (data, _) in frames.items():
+                if data is None:
+                    failed[t] = errors.get(t, 'no_data')
+                    continue
+                # Ograniczenie liczby ramek 'max' czekających w kolejce puli
+                while len(futures) >= max_in_flight:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                futures[pool.submit(backtest_ticker, t, data, years, step, horizon)] = t
+        finished, _ = wait(futures)
+        collect(finished)
+    parts = [p for p in parts if not p.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+def summarize(events):
+    '''Skuteczność stref wg przedziałów wyświetlanego prawdopodobieństwa.'''
+    if events.empty: return pd.DataFrame()
+    bucket = pd.cut(events['prob'], PROB_BUCKETS, right=False)
+    agg = {'signals': ('ticker', 'size'), 'touch_rate': ('touched', 'mean'), 'hold_rate': ('held', 'mean'), 'bars_to_touch': ('bars_to_touch', 'median')}
+    agg.update({f'fwd_ret_{h}': (f'fwd_ret_{h}', 'mean') for h in FORWARD_HORIZONS})
+    return events.groupby(bucket, observed=True).agg(**agg)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.backtest', description='Walk-forward skuteczności stref Fibo.')
+    parser.add_argument('--preset', action='append', default=[])
+    parser.add_argument('--all-presets', action='store_true')
+    parser.add_argument('--tickers-file')
+    parser.add_argument('--tickers')
+    parser.add_argument('--period', default='max', choices=['5y', '10y', 'max'], help='Historia do pobrania (z zapasem na SMA200 W1)')
+    parser.add_argument('--years', type=float, default=5, help='Długość replayu w latach')
+    parser.add_argument('--step', type=int, default=1, help='Co ile słupków oceniać strukturę')
+    parser.add_argument('--horizon', type=int, default=TOUCH_HORIZON)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rate', type=float, help='Limit zapytań/s do źródła danych (domyślnie $FIBO_FETCH_RATE lub 4)')
+    parser.add_argument('--provider', default=None, help='yahoo | store[:katalog] | replay[:katalog] | synthetic[:seed]')
+    parser.add_argument('--output-dir', default='output')
+    parser.add_argument('--format', default='parquet', choices=OUTPUT_FORMATS)
+    args = parser.parse_args(argv)
+    if args.provider: set_provider(args.provider)
+    if args.rate: set_fetch_rate(args.rate)
+
+    tickers = resolve_universe(args.preset, args.all_presets, args.tickers_file, args.tickers)
+    if not tickers:
+        print('Brak tickerów do replayu.', file=sys.stderr)
+        return 1
+
+    start, failed = time.perf_counter(), {}
+    events = run_backtest(tickers, args.period, args.years, args.step, args.horizon, args.workers, failed=failed)
+    elapsed = time.perf_counter() - start
+    write_table(events, os.path.join(args.output_dir, f'backtest_events.{args.format}'), args.format)
+
+    print(f'Replay {len(tickers)} tickerów w {elapsed:.1f}s, {len(events)} sygnałów')
+    if failed:
+        print(f'Pominięto {len(failed)} tickerów:', file=sys.stderr)
+        for t, reason in sorted(failed.items()):
+            print(f'  {t}: {reason}', file=sys.stderr)
+    with pd.option_context('display.width', 160, 'display.max_columns', 20):
+        print(summarize(events))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
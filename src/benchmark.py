@@ -0,0 +1,264 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+import numpy as np
+import pandas as pd
+from src.analyzer import find_all_significant_lows, cluster_levels
+from src.components_html import classify_result, render_ticker_card, _card_html
+from src.cache import period_covers
+from src.data_provider import analyze_ticker_data, resample_ohlcv, WEEKLY_TREND_PERIOD
+from src.indicators import ticker_values, feature_row
+from src.providers import SyntheticProvider, get_provider, set_provider
+
+UNIVERSE_SIZES = (20, 500, 5000)
+PERIODS = ('1y', '2y', '5y', 'max')
+STAGES = ('structure', 'clustering', 'features', 'cards', 'analyze')
+PERCENTILES = (50, 90, 99)
+BENCH_SEED = 7
+BENCH_END = '2025-12-31'  # Stały koniec serii - każde uruchomienie liczy te same słupki
+BENCH_DIR = 'data/benchmarks'
+BENCH_BATCH = 100
+MEMORY_SAMPLE = 50
+REGRESSION_THRESHOLD = 1.25  # p50 wolniejsze o >25% = regresja
+CARD_TIMESTAMP = '00:00:00'
+
+# =============================================================================
+# SEKCHJA 1: POMIAR ETAPÓW DLA JEDNEGO TICKERA
+# =============================================================================
+# Etapy jak w analyze_ticker_data, ale wywoływane osobno; 'analyze' = cała ścieżka tickera
+# z filtrami trendu (bez stanu przyrostowego, więc struktura liczona zawsze od zera).
+# 'cards' = render HTML karty, tylko dla tickerów, które kartę dają (n etapu = liczba kart).
+# 'features' jak w skanie: udział tickera w przebiegu panelowym paczki + jego wiersz FA-49.
+
+def _measure(stage, fn, times, peaks, shared_ns=0):
+    '''Czas (ns, plus `shared_ns` - udział w pracy wspólnej dla paczki) albo - w przebiegu pamięciowym - szczyt alokacji (B).'''
+    if peaks is None:
+        start = time.perf_counter_ns()
+        out = fn()
+        times[stage].append(time.perf_counter_ns() - start + shared_ns)
+        return out
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    out = fn()
+    peaks[stage] = max(peaks[stage], tracemalloc.get_traced_memory()[1] - base)
+    return out
+
+def run_ticker(ticker, df, w_data, values, times=None, peaks=None, shared_ns=0):
+    '''Wszystkie etapy dla jednego tickera (`values` z ticker_values paczki); zwraca kategorię wyniku (do kontroli obciążenia).'''
+    struct = _measure('structure', lambda: find_all_significant_lows(df), times, peaks)
+    zone_set = _measure('clustering', lambda: cluster_levels(struct), times, peaks) if struct else None
+    _measure('features', lambda: feature_row(values, zone_set), times, peaks, shared_ns)
+    _, result = _measure('analyze', lambda: analyze_ticker_data(ticker, df, w_data, '1d', None, values=values), times, peaks)
+    kind, payload, _ = classify_result(ticker, result, '1d', 0.0, timestamp=CARD_TIMESTAMP)
+    # 'cards' tylko dla tickerów z kartą - odrzucone nic nie renderują, a ich próbki zaniżałyby percentyle
+    if kind == 'card':
+        # Karta zawsze od zera - z cache HTML (np. z poprzedniego rozmiaru uniwersum) mierzylibyśmy tylko trafienia
+        _card_html.cache_clear()
+        _measure('cards', lambda: render_ticker_card(payload), times, peaks)
+    return kind
+
+# =============================================================================
+# SEKCHJA 2: PRZEBIEG DLA (ROZMIAR UNIWERSUM, OKRES)
+# =============================================================================
+
+def bench_tickers(size):
+    return [f'SYN{i:05d}' for i in range(size)]
+
+def load_batch(provider, tickers, period):
+    '''{ticker: (dane, tygodniówki)} jak load_timeframes, ale okno liczone od końca danych backendu, nie od dziś.'''
+    frames, _ = provider.fetch(tickers, period=period, interval='1d')
+    history = frames if period_covers(period, WEEKLY_TREND_PERIOD) else provider.fetch(tickers, period=WEEKLY_TREND_PERIOD, interval='1d')[0]
+    return {t: (frames.get(t), resample_ohlcv(history.get(t), '1wk')) for t in tickers}
+
+def run_config(tickers, period, memory_sample=MEMORY_SAMPLE):
+    '''Statystyki etapów dla jednego uniwersum i okresu; dane paczkami, żeby 5000 x max mieściło się w pamięci.'''
+    times = {stage: [] for stage in STAGES}
+    peaks = {stage: 0 for stage in STAGES}
+    kinds, bars = Counter(), 0
+    load_ns, start = 0, time.perf_counter_ns()
+
+    provider = get_provider()
+    for i in range(0, len(tickers), BENCH_BATCH):
+        load_start = time.perf_counter_ns()
+        frames = load_batch(provider, tickers[i:i + BENCH_BATCH], period)
+        load_ns += time.perf_counter_ns() - load_start
+        values_start = time.perf_counter_ns()
+        values = ticker_values({t: data for t, (data, _) in frames.items()})
+        shared_ns = (time.perf_counter_ns() - values_start) // max(1, len(values))
+        for t, (data, w_data) in frames.items():
+            if data is None or data.empty:
+                kinds['no_data'] += 1
+                continue
+            bars += len(data)
+            kinds[run_ticker(t, data, w_data, values[t], times, shared_ns=shared_ns)] += 1
+            # Pamięć osobnym przebiegiem na próbce - tracemalloc spowalnia i zafałszowałby czasy
+            if sum(kinds.values()) <= memory_sample:
+                tracemalloc.start()
+                try:
+                    run_ticker(t, data, w_data, values[t], peaks=peaks)
+                finally:
+                    tracemalloc.stop()
+
+    stages = {}
+    for stage, samples in times.items():
+        ms = np.array(samples, dtype=float) / 1e6
+        stats = {'n': len(ms), 'total_s': round(float(ms.sum()) / 1000, 3), 'peak_kb': round(peaks[stage] / 1024, 1)}
+        for p in PERCENTILES:
+            stats[f'p{p}_ms'] = round(float(np.percentile(ms, p)), 3) if len(ms) else None
+        stats['max_ms'] = round(float(ms.max()), 3) if len(ms) else None
+        stages[stage] = stats
+    return {
+        'tickers': len(tickers),
+        'period': period,
+        'bars': bars,
+        'results': dict(kinds),
+        'load_s': round(load_ns / 1e9, 3),
+        'wall_s': round((time.perf_counter_ns() - start) / 1e9, 3),
+        'stages': stages
+    }
+
+# =============================================================================
+# SEKCHJA 3: ZAPIS I PORÓWNANIE Z POPRZEDNIM URUCHOMIENIEM
+# =============================================================================
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _peak_rss_mb():
+    '''Szczyt RSS procesu (Linux/macOS); None tam, gdzie brak modułu resource.'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git': _git_revision()
+    }
+
+def save_run(run, bench_dir=BENCH_DIR):
+    runs_dir = os.path.join(bench_dir, 'runs')
+    os.makedirs(runs_dir, exist_ok=True)
+    path = os.path.join(runs_dir, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=4)
+    return path
+
+def previous_run(bench_dir=BENCH_DIR, exclude=None):
+    '''Najnowszy zapisany przebieg (nazwy plików sortują się chronologicznie).'''
+    paths = sorted(p for p in glob.glob(os.path.join(bench_dir, 'runs', '*.json')) if p != exclude)
+    return paths[-1] if paths else None
+
+def load_run(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def stage_table(run):
+    rows = [
+        {'tickers': c['tickers'], 'period': c['period'], 'stage': stage, **stats}
+        for c in run['configs'] for stage, stats in c['stages'].items()
+    ]
+    return pd.DataFrame(rows)
+
+def compare_runs(run, baseline, threshold=REGRESSION_THRESHOLD):
+    '''p50/p90 bieżącego przebiegu względem bazowego dla wspólnych (rozmiar, okres, etap).'''
+    cur, base = stage_table(run), stage_table(baseline)
+    if cur.empty or base.empty: return pd.DataFrame()
+    table = cur.merge(base, on=['tickers', 'period', 'stage'], suffixes=('', '_base'))
+    for col in ('p50_ms', 'p90_ms'):
+        table[f'{col}_ratio'] = (table[col] / table[f'{col}_base']).round(2)
+    table['regression'] = table['p50_ms_ratio'] > threshold
+    return table[['tickers', 'period', 'stage', 'p50_ms_base', 'p50_ms', 'p50_ms_ratio', 'p90_ms_base', 'p90_ms', 'p90_ms_ratio', 'regression']]
+
+def workload_changed(run, baseline):
+    '''Inne dane lub inne kategorie wyników = porównanie czasów nie jest miarodajne.'''
+    if run['data'] != baseline.get('data'): return True
+    base = {(c['tickers'], c['period']): (c['bars'], c['results']) for c in baseline['configs']}
+    return any(base.get((c['tickers'], c['period']), (c['bars'], c['results'])) != (c['bars'], c['results']) for c in run['configs'])
+
+# =============================================================================
+# SEKCHJA 4: CLI
+# =============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.benchmark', description='Benchmark etapów skanu na stałych danych (bez sieci).')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(UNIVERSE_SIZES))
+    parser.add_argument('--periods', nargs='+', default=list(PERIODS), choices=PERIODS)
+    parser.add_argument('--seed', type=int, default=BENCH_SEED)
+    parser.add_argument('--provider', default=None, help='Zamiast danych syntetycznych: store[:katalog] | replay[:katalog] (nagrane OHLCV)')
+    parser.add_argument('--tickers-file', help='Tickery nagranych danych (dla --provider); pierwsze N na rozmiar')
+    parser.add_argument('--memory-sample', type=int, default=MEMORY_SAMPLE, help='Tickerów na konfigurację w przebiegu pamięciowym')
+    parser.add_argument('--bench-dir', default=BENCH_DIR)
+    parser.add_argument('--compare', help='Plik przebiegu bazowego (domyślnie poprzedni zapisany)')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.provider:
+        if args.provider.partition(':')[0] not in ('store', 'replay'):
+            parser.error('--provider: tylko store/replay - benchmark nie korzysta z sieci')
+        provider = set_provider(args.provider)
+    else:
+        provider = set_provider(SyntheticProvider(args.seed, end=BENCH_END))
+    universe = bench_tickers(max(args.sizes))
+    if args.tickers_file:
+        from src.cli import parse_tickers
+        with open(args.tickers_file, 'r', encoding='utf-8') as f:
+            universe = parse_tickers(f.read())
+
+    run = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': environment(),
+        'data': {'provider': args.provider or provider.name, 'seed': None if args.provider else args.seed, 'end': None if args.provider else BENCH_END},
+        'configs': []
+    }
+    for size in sorted(args.sizes):
+        for period in args.periods:
+            config = run_config(universe[:size], period, args.memory_sample)
+            run['configs'].append(config)
+            print(f"{size:>5} tickerów, {period:>3}: {config['wall_s']:.1f}s (dane {config['load_s']:.1f}s), {config['bars']} słupków", file=sys.stderr)
+    run['peak_rss_mb'] = _peak_rss_mb()
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.max_rows', 500):
+        print(stage_table(run).to_string(index=False))
+        print(f"\nSzczyt RSS procesu: {run['peak_rss_mb']} MB")
+
+        path = None if args.no_save else save_run(run, args.bench_dir)
+        if path: print(f'Zapisano przebieg: {path}')
+        baseline_path = args.compare or previous_run(args.bench_dir, exclude=path)
+        if not baseline_path: return 0
+        baseline = load_run(baseline_path)
+        print(f'\nPorównanie z {baseline_path} ({baseline.get("environment", {}).get("git")}):')
+        if workload_changed(run, baseline): print('UWAGA: inne dane lub wyniki niż w przebiegu bazowym - czasy mogą być nieporównywalne')
+        diff = compare_runs(run, baseline, args.threshold)
+        if diff.empty:
+            print('Brak wspólnych konfiguracji do porównania.')
+            return 0
+        print(diff.to_string(index=False))
+        regressions = diff[diff['regression']]
+        if not regressions.empty:
+            print(f'\n{len(regressions)} regresji (p50 > x{args.threshold})', file=sys.stderr)
+            if args.fail_on_regression: return 2
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+import pandas as pd
+
+CACHE_DIR = 'data/cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Po jakim czasie (s) słupki uznajemy za nieświeże i dociągamy brakujące
+FRESHNESS_TTL = {'1d': 3600, '1wk': 6 * 3600, '1mo': 24 * 3600}
+DEFAULT_TTL = 15 * 60
+# Jak długo indeks pamięta usunięte wpisy (żeby inny proces ich nie przywrócił)
+TOMBSTONE_TTL = 7 * 24 * 3600
+
+PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1), '3mo': pd.DateOffset(months=3), '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1), '2y': pd.DateOffset(years=2), '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10), 'max': None
+}
+PERIOD_ORDER = list(PERIOD_OFFSETS.keys())
+
+# =============================================================================
+# SEKCHJA 1: POMOCNICZE OPERACJE NA OKRESACH
+# =============================================================================
+
+def period_covers(stored, requested):
+    '''Czy historia pobrana dla `stored` zawiera cały okres `requested`.'''
+    if stored not in PERIOD_ORDER or requested not in PERIOD_ORDER: return stored == requested
+    return PERIOD_ORDER.index(stored) >= PERIOD_ORDER.index(requested)
+
+def slice_period(df, period):
+    '''Przycina ramkę do okresu liczonego od dzisiaj (jak `period` w yfinance); brak słupków w okresie = None.'''
+    offset = PERIOD_OFFSETS.get(period)
+    if df is None or offset is None: return df
+    now = pd.Timestamp.now(tz=df.index.tz).normalize()
+    # Np. spółka wycofana z obrotu przed początkiem okresu - dla skanu to brak danych, nie pusta ramka
+    sliced = df[df.index >= now - offset]
+    return sliced if not sliced.empty else None
+
+# =============================================================================
+# SEKCHJA 2: MAGAZYN OHLCV (PARQUET + INDEKS JSON)
+# =============================================================================
+
+class OHLCVCache:
+    '''Lokalny magazyn kolumnowy OHLCV kluczowany (ticker, interwał).'''
+
+    def __init__(self, root=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = dict(FRESHNESS_TTL, **(ttl or {}))
+        self._lock = threading.RLock()
+        self._index_path = os.path.join(root, 'index.json')
+        self._index_mtime = None
+        self._batch_depth = 0
+        self._dirty = False
+        self._index, self._removed = self._load_index()
+
+    def _load_index(self):
+        '''(wpisy, usunięte {klucz: czas usunięcia}); stary format pliku to same wpisy.'''
+        if not os.path.exists(self._index_path): return {}, {}
+        try:
+            self._index_mtime = os.stat(self._index_path).st_mtime_ns
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}, {}
+        if 'entries' not in data: return data, {}
+        return data['entries'], data.get('removed', {})
+
+    @staticmethod
+    def _stored_at(entry):
+        # touch()/mark_fresh() zmieniają fetched_at, ale nie dane - usunięcie porównujemy z zapisem pliku
+        return entry.get('stored_at', entry['fetched_at'])
+
+    def _sync_index(self):
+        '''Scala indeks zapisany przez inne procesy (worker pre-skanu, inne instancje aplikacji).
+
+        Nowszy fetched_at wygrywa, a usunięcie (invalidate, eksmisja) wygrywa z wpisem zapisanym przed nim.
+        '''
+        try:
+            if os.stat(self._index_path).st_mtime_ns == self._index_mtime: return
+        except OSError:
+            return
+        with self._lock:
+            entries, removed = self._load_index()
+            for key, removed_at in removed.items():
+                self._removed[key] = max(removed_at, self._removed.get(key, 0))
+            for key, entry in entries.items():
+                mine = self._index.get(key)
+                if mine is None or entry['fetched_at'] > mine['fetched_at']: self._index[key] = entry
+            for key in [k for k, e in self._index.items() if self._removed.get(k, 0) >= self._stored_at(e)]:
+                del self._index[key]
+
+    @contextmanager
+    def batch(self):
+        '''Jeden zapis indeksu na koniec wielu put/append/touch/invalidate (np. cała paczka cached_download).'''
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._dirty: self._save_index()
+
+    def _save_index(self):
+        # Cały index.json przy każdym wpisie to O(n) na ticker - w batch() tylko oznaczamy zmianę
+        with self._lock:
+            if self._batch_depth:
+                self._dirty = True
+                return
+            self._write_index()
+
+    def _write_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._sync_index()
+        cutoff = time.time() - TOMBSTONE_TTL
+        self._removed = {k: t for k, t in self._removed.items() if t > cutoff}
+        tmp_path = f'{self._index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self._index, 'removed': self._removed}, f)
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.stat(self._index_path).st_mtime_ns
+        self._dirty = False
+
+    @staticmethod
+    def _key(ticker, interval):
+        return f'{interval}/{ticker}'
+
+    def _path(self, ticker, interval):
+        return os.path.join(self.root, 'ohlcv', interval, f"{quote(ticker, safe='')}.parquet")
+
+    def meta(self, ticker, interval):
+        '''Wpis indeksu; pusty także wtedy, gdy plik danych zniknął (np. usunięty przez inny proces).'''
+        self._sync_index()
+        with self._lock:
+            meta = dict(self._index.get(self._key(ticker, interval), {}))
+        return meta if meta and os.path.exists(self._path(ticker, interval)) else {}
+
+    def is_fresh(self, ticker, interval):
+        meta = self.meta(ticker, interval)
+        if not meta: return False
+        # fresh_until: dane z pre-skanu po sesji są aktualne do następnego otwarcia rynku
+        if meta.get('fresh_until', 0) > time.time(): return True
+        return time.time() - meta['fetched_at'] < self.ttl.get(interval, DEFAULT_TTL)
+
+    def covers(self, ticker, interval, period):
+        meta = self.meta(ticker, interval)
+        return bool(meta) and period_covers(meta['period'], period)
+
+    def get(self, ticker, interval):
+        '''Zwraca pełną zapisaną historię lub None.'''
+        key = self._key(ticker, interval)
+        path = self._path(ticker, interval)
+        self._sync_index()
+        with self._lock:
+            if key not in self._index: return None
+            if not os.path.exists(path):
+                self._index.pop(key)
+                self._save_index()
+                return None
+            self._index[key]['accessed_at'] = time.time()
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            self.invalidate(ticker, interval)
+            return None
+
+    def put(self, ticker, interval, df, period):
+        '''Zapisuje pełną historię pobraną dla `period`.'''
+        if df is None or df.empty: return
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        # attrs (struktura analizy) nie należą do magazynu danych
+        df.attrs = {}
+        path = self._path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self._index[self._key(ticker, interval)] = {
+                'period': period,
+                'stored_at': now,
+                'fetched_at': now,
+                'accessed_at': now,
+                'bytes': os.path.getsize(path),
+                'last_ts': str(df.index[-1])
+            }
+            self._evict()
+            self._save_index()
+
+    def append(self, ticker, interval, new_bars):
+        '''Dokleja nowe słupki; nadpisuje te same znaczniki czasu (niepełny ostatni słupek).'''
+        meta = self.meta(ticker, interval)
+        old = self.get(ticker, interval)
+        if old is None or not meta: return None
+        if new_bars is None or new_bars.empty:
+            self.touch(ticker, interval)
+            return old
+        merged = pd.concat([old[~old.index.isin(new_bars.index)], new_bars]).sort_index()
+        self.put(ticker, interval, merged, meta['period'])
+        return merged
+
+    def touch(self, ticker, interval):
+        '''Oznacza wpis jako świeży bez zmiany danych.'''
+        with self._lock:
+            entry = self._index.get(self._key(ticker, interval))
+            if entry:
+                entry['fetched_at'] = time.time()
+                self._save_index()
+
+    def mark_fresh(self, tickers, interval, until):
+        '''Wpisy świeże do `until` (timestamp) mimo TTL; nowe pobranie (put) znosi oznaczenie.'''
+        with self._lock:
+            now = time.time()
+            for t in tickers:
+                entry = self._index.get(self._key(t, interval))
+                if entry: entry.update(fetched_at=now, fresh_until=until)
+            self._save_index()
+
+    def invalidate(self, ticker=None, interval=None):
+        '''Usuwa wpisy pasujące do tickera i/lub interwału (brak argumentów = całość).'''
+        removed = 0
+        with self._lock:
+            for key in list(self._index):
+                k_interval, k_ticker = key.split('/', 1)
+                if (ticker is None or k_ticker == ticker) and (interval is None or k_interval == interval):
+                    self._remove(k_ticker, k_interval)
+                    removed += 1
+            self._save_index()
+        return removed
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(e['bytes'] for e in self._index.values())
+
+    def _remove(self, ticker, interval):
+        self._index.pop(self._key(ticker, interval), None)
+        self._removed[self._key(ticker, interval)] = time.time()
+        try:
+            os.remove(self._path(ticker, interval))
+        except OSError:
+            pass
+
+    def _evict(self):
+        '''LRU: usuwa najdawniej używane wpisy, aż rozmiar zmieści się w limicie.'''
+        total = sum(e['bytes'] for e in self._index.values())
+        if total <= self.max_bytes: return
+        for key in sorted(self._index, key=lambda k: self._index[k]['accessed_at']):
+            if total <= self.max_bytes: break
+            k_interval, k_ticker = key.split('/', 1)
+            total -= self._index[key]['bytes']
+            self._remove(k_ticker, k_interval)
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_default_cache():
+    '''Współdzielona instancja magazynu dla procesu.'''
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = OHLCVCache()
+        return _default_cache
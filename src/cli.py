@@ -0,0 +1,186 @@
+import argparse
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from src.utils import load_presets
+from src.scanner import iter_downloads, chunk_values, DEFAULT_MAX_WORKERS, DEFAULT_BATCH_SIZE
+from src.data_provider import analyze_ticker_data
+from src.structure_state import get_default_state_store
+from src.indicators import FEATURE_COLUMNS
+from src.providers import set_provider
+from src.fetcher import set_fetch_rate
+from src.metrics import ScanMetrics, write_metrics
+
+ZONE_COLUMNS = ['ticker', 'rank', 'avg_price', 'min_price', 'max_price', 'total_score', 'total_count', 'dist_pct', 'is_main']
+OUTPUT_FORMATS = ['parquet', 'csv', 'jsonl']
+
+# =============================================================================
+# SEKCHJA 1: UNIWERSUM I SHARDING
+# =============================================================================
+
+def parse_tickers(text):
+    return [t.strip().upper() for t in text.replace('\n', ',').split(',') if t.strip() and not t.strip().startswith('#')]
+
+def resolve_universe(presets=(), all_presets=False, tickers_file=None, tickers=None):
+    '''Łączy tickery z presetów, pliku i argumentu; bez duplikatów, posortowane.'''
+    saved = load_presets()
+    names = list(saved) if all_presets else list(presets)
+    unknown = [n for n in names if n not in saved]
+    if unknown: raise SystemExit(f"Nieznane presety: {', '.join(unknown)}")
+
+    universe = [t for n in names for t in saved[n]]
+    if tickers_file:
+        with open(tickers_file, 'r', encoding='utf-8') as f:
+            universe += parse_tickers(f.read())
+    if tickers: universe += parse_tickers(tickers)
+    return sorted(set(universe))
+
+def parse_shard(text):
+    '''"i/N" -> (i, N), numeracja od 1.'''
+    try:
+        index, count = (int(x) for x in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Shard w formacie i/N, np. 2/4')
+    if not 1 <= index <= count: raise argparse.ArgumentTypeError('Shard musi spełniać 1 <= i <= N')
+    return index, count
+
+def select_shard(tickers, shard):
+    '''Stabilny podział po hashu tickera - ten sam na każdej maszynie, niezależny od kolejności listy.'''
+    if shard is None: return list(tickers)
+    index, count = shard
+    return [t for t in tickers if zlib.crc32(t.encode()) % count == index - 1]
+
+# =============================================================================
+# SEKCHJA 2: ANALIZA W PULI PROCESÓW
+# =============================================================================
+
+def analyze_rows(ticker, data, w_data, interval, values=None, metrics=None):
+    '''Uruchamiane w procesie roboczym; zwraca tylko małe wiersze wynikowe zamiast ramek.'''
+    _, result = analyze_ticker_data(ticker, data, w_data, interval, get_default_state_store(), metrics, values)
+    if result is None or result.zones is None: return ticker, 'rejected' if result is None else 'no_structure', [], None
+
+    zones = []
+    for z in range(len(result.zones)):
+        zone = result.zone(z)
+        zones.append({
+            'ticker': ticker,
+            'rank': z + 1,
+            'avg_price': zone['avg_price'],
+            'min_price': zone['min_price'],
+            'max_price': zone['max_price'],
+            'total_score': zone['total_score'],
+            'total_count': zone['total_count'],
+            'dist_pct': (result.last_close - zone['avg_price']) / result.last_close * 100,
+            'is_main': z == result.main_zone
+        })
+    return ticker, 'accepted' if result.main_zone is not None else 'no_zone', zones, result.data_vector
+
+def analyze_rows_timed(ticker, data, w_data, interval, values=None):
+    '''Jak analyze_rows, plus czasy etapów z procesu roboczego (do scalenia w procesie głównym).'''
+    metrics = ScanMetrics()
+    return analyze_rows(ticker, data, w_data, interval, values, metrics), metrics.snapshot()
+
+def run_scan(tickers, period, interval, workers, download_workers, batch_size, refresh=False, metrics=None):
+    '''Pobieranie wsadowe w wątkach procesu głównego, analiza w puli procesów.'''
+    zones, features, statuses, errors = [], [], {}, {}
+    futures, max_in_flight = {}, 2 * (workers or os.cpu_count() or 1)
+
+    def collect(finished):
+        for future in finished:
+            ticker = futures.pop(future)
+            try:
+                rows = future.result()
+                if metrics is not None:
+                    rows, snapshot = rows
+                    metrics.merge(snapshot)
+                _, status, zone_rows, vector = rows
+            except Exception:
+                status, zone_rows, vector = 'error', [], None
+            statuses[ticker] = status
+            zones.extend(zone_rows)
+            if vector: features.append(vector)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for frames in iter_downloads(tickers, period, interval, download_workers, batch_size, refresh=refresh, errors=errors, metrics=metrics):
+            # Wskaźniki końcowe całej paczki jednym przebiegiem w procesie głównym; do workera idzie tylko wiersz tickera
+            values = chunk_values(frames, metrics)
+            for t, (data, w_data) in frames.items():
+                if data is None or data.empty:
+                    statuses[t] = errors.get(t, 'no_data')
+                    continue
+                # Ograniczenie liczby ramek czekających w kolejce puli
+                while len(futures) >= max_in_flight:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                futures[pool.submit(analyze_rows_timed if metrics is not None else analyze_rows, t, data, w_data, interval, values.get(t))] = t
+        finished, _ = wait(futures)
+        collect(finished)
+    return pd.DataFrame(zones, columns=ZONE_COLUMNS), pd.DataFrame(features, columns=FEATURE_COLUMNS), statuses
+
+# =============================================================================
+# SEKCHJA 3: ZAPIS WYNIKÓW
+# =============================================================================
+
+def write_table(df, path, fmt):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if fmt == 'parquet': df.to_parquet(path, index=False)
+    elif fmt == 'csv': df.to_csv(path, index=False)
+    else: df.to_json(path, orient='records', lines=True, date_format='iso')
+
+def output_path(output_dir, name, fmt, shard):
+    suffix = f'.shard-{shard[0]}-of-{shard[1]}' if shard else ''
+    return os.path.join(output_dir, f'{name}{suffix}.{fmt}')
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m src.cli', description='FiboLevels AI - skaner wsadowy (bez UI).')
+    source = parser.add_argument_group('uniwersum')
+    source.add_argument('--preset', action='append', default=[], help='Nazwa presetu z data/presets.json (można powtarzać)')
+    source.add_argument('--all-presets', action='store_true', help='Wszystkie zapisane presety')
+    source.add_argument('--tickers-file', help='Plik z tickerami (przecinki lub nowe linie, # = komentarz)')
+    source.add_argument('--tickers', help='Lista tickerów po przecinku')
+    parser.add_argument('--period', default='5y', choices=['1y', '2y', '5y', 'max'])
+    parser.add_argument('--interval', default='1d', choices=['1d', '1wk'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesy analizy (domyślnie liczba rdzeni)')
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument('--rate', type=float, help='Limit zapytań/s do źródła danych (domyślnie $FIBO_FETCH_RATE lub 4)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--shard', type=parse_shard, help='Fragment uniwersum i/N do podziału między maszyny')
+    parser.add_argument('--output-dir', default='output')
+    parser.add_argument('--format', default='parquet', choices=OUTPUT_FORMATS)
+    parser.add_argument('--refresh', action='store_true', help='Dociągnij nowe słupki mimo świeżego cache')
+    parser.add_argument('--provider', default=None, help='Źródło danych: yahoo | store[:katalog] | replay[:katalog] | synthetic[:seed] (domyślnie $FIBO_DATA_PROVIDER lub yahoo)')
+    parser.add_argument('--metrics', help='Zapis czasów etapów i liczników: plik .json lub .prom (Prometheus)')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.provider: set_provider(args.provider)
+    if args.rate: set_fetch_rate(args.rate)
+    universe = resolve_universe(args.preset, args.all_presets, args.tickers_file, args.tickers)
+    tickers = select_shard(universe, args.shard)
+    if not tickers:
+        print('Brak tickerów do skanowania.', file=sys.stderr)
+        return 1
+
+    metrics = ScanMetrics(label=f'cli {args.period} {args.interval}') if args.metrics else None
+    start = time.perf_counter()
+    zones, features, statuses = run_scan(tickers, args.period, args.interval, args.workers, args.download_workers, args.batch_size, args.refresh, metrics)
+    elapsed = time.perf_counter() - start
+
+    for name, table in (('zones', zones), ('features', features)):
+        write_table(table, output_path(args.output_dir, name, args.format, args.shard), args.format)
+
+    counts = pd.Series(statuses).value_counts().to_dict()
+    print(f"Przeskanowano {len(tickers)} tickerów w {elapsed:.1f}s ({len(tickers) / elapsed:.1f} tickerów/s)")
+    print('Statusy: ' + ', '.join(f'{k}={v}' for k, v in sorted(counts.items())))
+    print(f'Zapisano: {len(zones)} stref, {len(features)} wektorów cech -> {args.output_dir}')
+    if metrics is not None:
+        write_metrics(metrics.finish(), args.metrics)
+        print(f'Metryki: {args.metrics}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
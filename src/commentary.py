@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from src.cache import CACHE_DIR
+from src.models import ScanResult, zone_status
+
+COMMENTARY_DIR = os.path.join(CACHE_DIR, 'commentary')
+DEFAULT_MODEL = 'gpt-4o-mini'
+# USD za 1M tokenów: (wejście, wejście z cache promptu, wyjście)
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4.1-nano': (0.10, 0.025, 0.40),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1': (2.00, 0.50, 8.00)
+}
+BATCH_SIZE = 15  # tickerów w jednym zapytaniu
+MAX_CONCURRENCY = 4
+REQUEST_TIMEOUT = 60
+MAX_RETRIES = 3
+MAX_COMMENT_CHARS = 600
+EXTRA_ZONES = 3
+PROMPT_VERSION = 1  # Zmiana promptu = nowe klucze cache
+
+SYSTEM_PROMPT = '''Jesteś analitykiem technicznym. Wejście to JSON: ticker -> cechy FA-49 (cena, SMA200, odległość i nachylenie SMA200 w %, RSI14, ATR14, liczba dołków HL) oraz strefy wsparcia Fibonacciego poniżej ceny (strefa główna z poziomami i kilka kolejnych).
+Dla każdego tickera napisz 2-3 zdania po polsku: gdzie jest cena względem strefy głównej (dystans w ATR), co sugerują RSI i trend SMA200 oraz na co uważać. Bez rekomendacji kupna/sprzedaży.
+Odpowiedz wyłącznie obiektem JSON {"TICKER": "komentarz", ...} z dokładnie tymi samymi tickerami.'''
+
+# =============================================================================
+# SEKCHJA 1: WEJŚCIE MODELU I KLUCZ CACHE
+# =============================================================================
+
+def _round(value, digits=4):
+    return round(value, digits) if isinstance(value, float) else value
+
+def commentary_input(result):
+    '''Wszystko, co widzi model: wektor FA-49 i podsumowanie stref (bez znacznika czasu skanu).'''
+    main = result.zone()
+    zones = [
+        {k: _round(v) for k, v in result.zone(z).items()}
+        for z in range(len(result.zones)) if z != result.main_zone and result.zones.zones['avg_price'][z] < result.last_close
+    ][:EXTRA_ZONES]
+    return {
+        'interval': result.interval,
+        'features': {k: _round(v) for k, v in result.data_vector.items() if k != 'ticker'},
+        'main_zone': {
+            **{k: _round(v) for k, v in main.items()},
+            'status': zone_status(main['total_score']),
+            'levels': sorted(result.zones.level_types(result.main_zone)),
+            'dist_pct': round((result.last_close - main['avg_price']) / result.last_close * 100, 2)
+        },
+        'other_zones': zones
+    }
+
+def commentary_key(inputs, model):
+    '''Hash wejścia, modelu i wersji promptu - niezmienione dane tickera = ten sam komentarz.'''
+    blob = json.dumps({'version': PROMPT_VERSION, 'model': model, 'input': inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def request_cost(model, usage):
+    '''Koszt zapytania w USD z `usage` odpowiedzi (tokeny z cache promptu taniej).'''
+    if usage is None: return 0.0
+    price_in, price_cached, price_out = MODEL_PRICES[model]
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) or 0
+    return ((usage.prompt_tokens - cached) * price_in + cached * price_cached + usage.completion_tokens * price_out) / 1e6
+
+# =============================================================================
+# SEKCHJA 2: CACHE KOMENTARZY NA DYSKU
+# =============================================================================
+
+class CommentaryCache:
+    '''Komentarz per klucz wejścia: plik JSON na dysku + kopia w pamięci.'''
+
+    def __init__(self, root=COMMENTARY_DIR):
+        self.root = root
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f'{key}.json')
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem: return self._mem[key]
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                text = json.load(f)['text']
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._mem[key] = text
+        return text
+
+    def put(self, key, ticker, text, model):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'ticker': ticker, 'model': model, 'created_at': time.time(), 'text': text}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._mem[key] = text
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_commentary_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = CommentaryCache()
+        return _default_cache
+
+# =============================================================================
+# SEKCHJA 3: ZAPYTANIA PACZKAMI (ASYNC, OGRANICZONA WSPÓŁBIEŻNOŚĆ)
+# =============================================================================
+
+@dataclass(slots=True)
+class CommentaryRun:
+    '''Wynik jednego przebiegu: teksty, koszt i statystyki cache.'''
+    texts: dict = field(default_factory=dict)
+    cost: float = 0.0
+    cached: int = 0
+    requested: int = 0
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    failed: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+def _client_class():
+    '''AsyncOpenAI; z Langfuse (śledzenie zapytań), gdy ustawiono jego klucze.'''
+    if os.environ.get('LANGFUSE_PUBLIC_KEY'):
+        try:
+            from langfuse.openai import AsyncOpenAI
+            return AsyncOpenAI
+        except ImportError:
+            pass
+    from openai import AsyncOpenAI
+    return AsyncOpenAI
+
+def _parse_texts(content, tickers):
+    '''{"TICKER": "komentarz"} z odpowiedzi; nieznane tickery i puste teksty pomijamy.'''
+    data = json.loads(content or '{}')
+    if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), dict): data = next(iter(data.values()))
+    wanted = set(tickers)
+    return {t: str(text).strip()[:MAX_COMMENT_CHARS] for t, text in data.items() if t in wanted and str(text).strip()}
+
+async def _comment_batch(client, model, batch, semaphore):
+    payload = {t: inputs for t, inputs, _ in batch}
+    async with semaphore:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': json.dumps(payload, ensure_ascii=False, default=str)}
+            ],
+            response_format={'type': 'json_object'},
+            temperature=0.3
+        )
+    return _parse_texts(response.choices[0].message.content, payload), response.usage
+
+async def _comment_batches(batches, api_key, model, base_url, concurrency):
+    client = _client_class()(api_key=api_key, base_url=base_url, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES)
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        return await asyncio.gather(*(_comment_batch(client, model, batch, semaphore) for batch in batches), return_exceptions=True)
+    finally:
+        await client.close()
+
+def _run_coroutine(coro):
+    # W wątku z działającą pętlą (np. notebook) asyncio.run nie zadziała - osobny wątek
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+def comment_results(results, api_key=None, model=DEFAULT_MODEL, base_url=None, batch_size=BATCH_SIZE,
+                    concurrency=MAX_CONCURRENCY, cache=None, cached_only=False):
+    '''{ticker: ScanResult} -> CommentaryRun; komentarze z cache za darmo, brakujące paczkami w kilku równoległych zapytaniach.
+
+    cached_only=True - tylko odczyt cache (bez zapytań i kosztów), np. przy zmianie filtrów.
+    '''
+    if model not in MODEL_PRICES: raise ValueError(f"Brak cennika dla modelu {model} (dostępne: {', '.join(MODEL_PRICES)})")
+    cache = cache or get_commentary_cache()
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    run, todo = CommentaryRun(), []
+    for t, result in results.items():
+        if not isinstance(result, ScanResult) or result.main_zone is None: continue
+        inputs = commentary_input(result)
+        key = commentary_key(inputs, model)
+        text = cache.get(key)
+        if text is not None:
+            run.texts[t] = text
+            run.cached += 1
+        elif not cached_only:
+            todo.append((t, inputs, key))
+    if not todo or not api_key: return run
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    outcomes = _run_coroutine(_comment_batches(batches, api_key, model, base_url, concurrency))
+    run.requested, run.requests = len(todo), len(batches)
+    for batch, outcome in zip(batches, outcomes):
+        if isinstance(outcome, Exception):
+            run.failed += [t for t, _, _ in batch]
+            run.errors.append(f'{type(outcome).__name__}: {outcome}')
+            continue
+        texts, usage = outcome
+        run.cost += request_cost(model, usage)
+        if usage is not None:
+            run.prompt_tokens += usage.prompt_tokens
+            run.completion_tokens += usage.completion_tokens
+        for t, _, key in batch:
+            if t in texts:
+                run.texts[t] = texts[t]
+                cache.put(key, t, texts[t], model)
+            else:
+                run.failed.append(t)
+    return run
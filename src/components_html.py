@@ -1,3 +1,9 @@
+import html
+import time
+from functools import lru_cache
+import pandas as pd
+from src.models import FetchFailure, ZONE_STATUSES, zone_status
+
 def get_status_class(prob):
     # Logika statusu oparta na procentach (0-100)
     if prob >= 70: return 'status-high'
@@ -43,48 +49,138 @@ def get_card_styles():
 .ai-header { color: #007bff; text-transform: uppercase; font-weight: bold; font-size: 0.9rem; }
 .ai-content { font-size: 0.95rem; color: #f0f0f0; margin-top: 8px; list-style-type: none; padding-left: 0; margin-left: 0; line-height: 1.6; }
 .warning-item { color: #ff4b4b; font-weight: bold; }
+.fibo-grid { display: grid !important; grid-template-columns: repeat(auto-fill, minmax(480px, 1fr)); column-gap: 20px; width: 100%; }
 </style>'''
 
-def render_ticker_card(data):
-    # data.get('prob') przychodzi jako 0-100
-    status_class = get_status_class(data.get('prob', 0))
-    
-    items = data.get('ai_desc', [])
-    list_items = ''
-    for item in items:
-        is_warning = '⚠️' in item or 'ABSORPCJA' in item
-        css_class = " class='warning-item'" if is_warning else ""
-        list_items += f'<li{css_class}>{item}</li>'
-    
-    return f'''
+CARD_TEMPLATE = '''
 <div class='fibo-container'>
     <div class='fibo-card {status_class}'>
         <div class='card-header'>
             <div>
-                <div class='ticker-name'>{data.get('ticker', 'N/A')}</div>
-                <div style='color: #888; font-size: 0.8rem;'>Skan: {data.get('timestamp')}</div>
+                <div class='ticker-name'>{ticker}</div>
+                <div style='color: #888; font-size: 0.8rem;'>Skan: {timestamp}</div>
             </div>
             <div style='text-align: right;'>
                 <span style='color: #aaa; font-size: 0.7rem; text-transform: uppercase;'>Prawdopodobieństwo</span><br>
-                <span class='prob-value'>{int(data.get('prob', 0))}%</span>
+                <span class='prob-value'>{prob}%</span>
             </div>
         </div>
         <div class='grid-top'>
-            <div class='stat-item'><span class='stat-label'>Cena Akt.</span><span class='stat-value'>{format_pl(data.get('price'))}</span></div>
+            <div class='stat-item'><span class='stat-label'>Cena Akt.</span><span class='stat-value'>{price}</span></div>
             <div class='stat-item'>
                 <span class='stat-label'>Siła Strefy</span>
-                <span class='stat-value'>{data.get('strength', 0):.1f}<span class='trend-dot'></span></span>
+                <span class='stat-value'>{strength:.1f}<span class='trend-dot'></span></span>
             </div>
-            <div class='stat-item'><span class='stat-label'>Interwał</span><span class='stat-value'>{data.get('interval_short')}</span></div>
+            <div class='stat-item'><span class='stat-label'>Interwał</span><span class='stat-value'>{interval}</span></div>
         </div>
         <div class='grid-bottom'>
-            <div class='stat-item'><span class='stat-label'>Środek Strefy</span><span class='stat-value'>{format_pl(data.get('fibo'))}</span></div>
-            <div class='stat-item'><span class='stat-label'>Dół Strefy</span><span class='stat-value'>{format_pl(data.get('fibo_low'))}</span></div>
-            <div class='stat-item'><span class='stat-label'>Góra Strefy</span><span class='stat-value'>{format_pl(data.get('fibo_high'))}</span></div>
+            <div class='stat-item'><span class='stat-label'>Środek Strefy</span><span class='stat-value'>{fibo}</span></div>
+            <div class='stat-item'><span class='stat-label'>Dół Strefy</span><span class='stat-value'>{fibo_low}</span></div>
+            <div class='stat-item'><span class='stat-label'>Góra Strefy</span><span class='stat-value'>{fibo_high}</span></div>
         </div>
         <div class='ai-section'>
             <strong class='ai-header'>Analiza Geometrii i Wolumenu</strong>
             <ul class='ai-content'>{list_items}</ul>
         </div>
     </div>
-</div>'''
\ No newline at end of file
+</div>'''
+CARD_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=CARD_CACHE_SIZE)
+def _card_html(frozen):
+    data = dict(frozen)
+    warning = " class='warning-item'"
+    list_items = ''.join(f"<li{warning if '⚠️' in item or 'ABSORPCJA' in item else ''}>{item}</li>" for item in data.get('ai_desc', ()))
+    return CARD_TEMPLATE.format(
+        # data.get('prob') przychodzi jako 0-100
+        status_class=get_status_class(data.get('prob', 0)),
+        ticker=data.get('ticker', 'N/A'),
+        timestamp=data.get('timestamp'),
+        prob=int(data.get('prob', 0)),
+        price=format_pl(data.get('price')),
+        strength=data.get('strength', 0),
+        interval=data.get('interval_short'),
+        fibo=format_pl(data.get('fibo')),
+        fibo_low=format_pl(data.get('fibo_low')),
+        fibo_high=format_pl(data.get('fibo_high')),
+        list_items=list_items
+    )
+
+def render_ticker_card(data):
+    '''HTML karty; ten sam zestaw danych (ticker, wynik, komentarz, czas skanu) = HTML z cache.'''
+    return _card_html(tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in data.items()))
+
+def render_card_grid(cards):
+    '''Wiele kart jako jeden dokument HTML - jeden element Streamlit zamiast jednego na ticker.'''
+    return f"<div class='fibo-grid'>{''.join(render_ticker_card(c) for c in cards)}</div>"
+
+def zone_distance_pct(card):
+    return (card['price'] - card['fibo']) / card['price'] * 100 if card.get('price') else None
+
+# Klucze sortowania kart (rosnąco)
+CARD_SORTS = {
+    'Siła strefy': lambda c: -c['strength'],
+    'Prawdopodobieństwo': lambda c: -c['prob'],
+    'Dystans do strefy': lambda c: zone_distance_pct(c),
+    'Ticker': lambda c: c['ticker']
+}
+PAGE_SIZES = [12, 24, 48, 96]
+
+def card_table(cards):
+    '''Tryb kompaktowy: jeden wiersz na kartę (sortowanie po kliknięciu w nagłówek).'''
+    return pd.DataFrame([{
+        'Ticker': c['ticker'],
+        'Prob. %': c['prob'],
+        'Siła': c['strength'],
+        'Status': zone_status(c['strength']),
+        'Cena': c['price'],
+        'Strefa': c['fibo'],
+        'Dół': c['fibo_low'],
+        'Góra': c['fibo_high'],
+        'Dystans %': round(zone_distance_pct(c), 2),
+        'Komentarz': next((item[2:] for item in c['ai_desc'] if item.startswith('🤖')), '')
+    } for c in cards], columns=['Ticker', 'Prob. %', 'Siła', 'Status', 'Cena', 'Strefa', 'Dół', 'Góra', 'Dystans %', 'Komentarz'])
+
+CATEGORY_LABELS = {
+    'card': '✅ Karty',
+    'rejected': '📉 Trend spadkowy',
+    'no_zone': '🔍 Brak stref',
+    'low_prob': '⚖️ Niskie prob.',
+    'filtered': '🚫 Odfiltrowane',
+    'fetch_error': '🌐 Nie pobrano',
+    'error': '⚠️ Błędy'
+}
+
+def classify_result(ticker, result, interval, min_prob, statuses=ZONE_STATUSES, timestamp=None, commentary=None):
+    '''Zwraca (kategoria, dane, siła strefy); kategoria jak w CATEGORY_LABELS, `commentary` = {ticker: komentarz AI}.'''
+    if result is None: return 'rejected', ticker, None
+    if isinstance(result, FetchFailure): return 'fetch_error', f"{ticker} ({result.label})", None
+    if result.zones is None: return 'no_zone', ticker, None
+    try:
+        main_zone = result.zone()
+        if not main_zone: return 'no_zone', ticker, None
+
+        prob_pct = main_zone['total_score'] * 10
+        if (prob_pct / 100.0) < min_prob: return 'low_prob', f"{ticker} ({prob_pct:.0f}%)", None
+        status = zone_status(main_zone['total_score'])
+        if status not in statuses: return 'filtered', f"{ticker} ({status})", None
+
+        card_data = {
+            'ticker': ticker,
+            'timestamp': timestamp or time.strftime('%H:%M:%S'),
+            'prob': prob_pct, 
+            'strength': main_zone['total_score'],
+            'price': result.last_close,
+            'interval_short': interval,
+            'n_samples': result.n_bars,
+            'fibo': main_zone['avg_price'],
+            'label_low': 'Dół Strefy',
+            'fibo_low': main_zone['min_price'],
+            'label_high': 'Góra Strefy',
+            'fibo_high': main_zone['max_price'],
+            # Tekst z LLM trafia do HTML karty - tylko po escapowaniu, bez pustych linii (koniec bloku HTML w markdown)
+            'ai_desc': result.signals + ([f"🤖 {' '.join(html.escape(commentary[ticker]).split())}"] if commentary and ticker in commentary else [])
+        }
+        return 'card', card_data, main_zone['total_score']
+    except Exception as e:
+        return 'error', f"Błąd renderowania {ticker}: {e}", None
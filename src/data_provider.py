@@ -1,230 +1,184 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
+from src.analyzer import get_fib_levels, find_clusters, cluster_levels, find_all_significant_lows
+from src.cache import get_default_cache, slice_period, period_covers, PERIOD_OFFSETS
+from src.providers import get_provider
+from src.indicators import ticker_values, feature_row
+from src.metrics import timed, count
+from src.models import ScanResult, ZONE_STATUSES, zone_status
+from src.structure_state import incremental_structure
 
 # =============================================================================
-# SEKCHJA 1: LOGIKA FIBONACCIEGO I KLASTRÓW (EPIC 1)
+# SEKCHJA 1: POBIERANIE DANYCH I FILTRY (FA-42: FA-43 do FA-49)
 # =============================================================================
 
-def get_fib_levels(start_price, end_price, start_date):
-    '''Wylicza poziomy Fibo dla konkretnego impulsu z wagami.'''
-    diff = end_price - start_price
-    return {
-        '38.2%': {'price': end_price - diff * 0.382, 'date': start_date, 'weight': 1.0},
-        '50.0%': {'price': end_price - diff * 0.500, 'date': start_date, 'weight': 1.2},
-        '61.8%': {'price': end_price - diff * 0.618, 'date': start_date, 'weight': 1.5},
-        '78.6%': {'price': end_price - diff * 0.786, 'date': start_date, 'weight': 1.5}
-    }
-
-def find_clusters(structure):
-    '''Szuka klastrów i agreguje poziomy w strefy.'''
-    all_levels = []
-    hh_price = structure['hh']['price']
-    
-    for hl in structure['hls']:
-        levels_dict = get_fib_levels(hl['price'], hh_price, hl['date'])
-        for name, data in levels_dict.items():
-            level_score = hl.get('score', 1.0) * data['weight']
-            all_levels.append({
-                'price': data['price'], 
-                'from_hl': hl['price'], 
-                'date': data['date'],
-                'type': name,
-                'score': level_score
-            })
-    
-    all_levels.sort(key=lambda x: x['price'])
-    
-    clusters = []
-    i = 0
-    while i < len(all_levels):
-        current_cluster = [all_levels[i]]
-        j = i + 1
-        while j < len(all_levels) and (all_levels[j]['price'] - all_levels[i]['price']) / all_levels[i]['price'] < 0.0050:
-            current_cluster.append(all_levels[j])
-            j += 1
-        
-        if len(current_cluster) >= 2:
-            avg_price = sum(c['price'] for c in current_cluster) / len(current_cluster)
-            total_score = sum(c['score'] for c in current_cluster)
-            clusters.append({
-                'avg_price': avg_price,
-                'min_price': min(c['price'] for c in current_cluster),
-                'max_price': max(c['price'] for c in current_cluster),
-                'count': len(current_cluster),
-                'total_score': total_score,
-                'levels': sorted(current_cluster, key=lambda x: x['date'])
-            })
-        i = j
-
-    if not clusters: return []
-    
-    zones = []
-    clusters.sort(key=lambda x: x['avg_price'])
-    i = 0
-    while i < len(clusters):
-        current_zone = [clusters[i]]
-        j = i + 1
-        while j < len(clusters) and (clusters[j]['avg_price'] - clusters[i]['avg_price']) / clusters[i]['avg_price'] < 0.012:
-            current_zone.append(clusters[j])
-            j += 1
-        
-        z_min = min(c['min_price'] for c in current_zone)
-        z_max = max(c['max_price'] for c in current_zone)
-        zones.append({
-            'avg_price': (z_min + z_max) / 2,
-            'min_price': z_min,
-            'max_price': z_max,
-            'total_score': sum(c['total_score'] for c in current_zone),
-            'total_count': sum(c['count'] for c in current_zone),
-            'levels': sorted([lvl for c in current_zone for lvl in c['levels']], key=lambda x: x['price'])
-        })
-        i = j
-    return sorted(zones, key=lambda x: x['total_score'], reverse=True)
-
-# =============================================================================
-# SEKCHJA 2: ANALIZA STRUKTURY I WYCKOFF EFFORT
-# =============================================================================
-
-def find_all_significant_lows(df):
-    '''Szukanie dołków z analizą Wyckoffa i resetem struktury.'''
-    if df is None or len(df) < 252: return None
-    
-    df = df.copy()
-    df['Vol_MA20'] = df['Volume'].rolling(20).mean()
-    df['Price_Range'] = df['High'] - df['Low']
-    df['Effort_Ratio'] = df['Volume'] / df['Price_Range'].replace(0, np.nan)
-    df['Eff_MA20'] = df['Effort_Ratio'].rolling(20).mean()
-    
-    yearly_df = df.tail(252)
-    hh_val = float(yearly_df['High'].max())
-    hh_idx = yearly_df['High'].idxmax()
-    hh_pos = df.index.get_loc(hh_idx)
-    
-    search_start = max(0, hh_pos - 252)
-    candidates = []
-
-    for i in range(search_start + 8, hh_pos - 5):
-        low_val = float(df['Low'].iloc[i])
-        if low_val == df['Low'].iloc[i-8:i+9].min():
-            v_score = 1.0
-            if df['Volume'].iloc[i] > df['Vol_MA20'].iloc[i] * 1.5: v_score += 1.0
-            if df['Effort_Ratio'].iloc[i] > df['Eff_MA20'].iloc[i] * 2.0: v_score += 1.0
-            
-            recent_high = df['High'].iloc[i-15:i].max()
-            future_window = df.iloc[i:min(i+35, hh_pos)]
-            if not future_window.empty:
-                if future_window['High'].max() > recent_high or (future_window['High'].max() - low_val) / low_val > 0.09:
-                    candidates.append({'date': df.index[i], 'price': low_val, 'score': v_score})
-
-    if not candidates: return None
-
-    final_hls = []
-    for c in sorted(candidates, key=lambda x: x['date']):
-        final_hls = [h for h in final_hls if h['price'] < c['price']]
-        if not final_hls or (c['date'] - final_hls[-1]['date']).days > 20:
-            final_hls.append(c)
-        else:
-            if c['price'] < final_hls[-1]['price']: final_hls[-1] = c
-
-    significant_lows = [l for l in final_hls if (hh_val - l['price']) / l['price'] >= 0.10]
-    return {'hh': {'date': hh_idx, 'price': hh_val}, 'hls': significant_lows}
-
-# =============================================================================
-# SEKCHJA 3: POBIERANIE DANYCH I FILTRY (FA-42: FA-43 do FA-49)
-# =============================================================================
-
-def fetch_ticker_data(ticker, period='2y', interval='1d'):
+def normalize_ohlcv(data):
+    '''Spłaszcza kolumny MultiIndex zwracane przez yfinance dla jednego tickera.'''
+    if data is None or data.empty: return None
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+def download_batch(tickers, period='2y', interval='1d', threads=True, start=None, errors=None, metrics=None):
+    '''Pobiera OHLCV dla wielu tickerów z bieżącego backendu (Yahoo, magazyn, dane syntetyczne).'''
+    tickers = list(tickers)
+    if not tickers: return {}
+    max_workers = None if threads is True else max(1, int(threads or 1))
+    frames, failed = get_provider().fetch(tickers, period=period, interval=interval, start=start, max_workers=max_workers, metrics=metrics)
+    if errors is not None: errors.update(failed)
+    count(metrics, 'fetch_errors', len(failed))
+    return {t: normalize_ohlcv(frames.get(t)) for t in tickers}
+
+def _overlap_matches(cached, new_bars):
+    '''Czy wspólny słupek się zgadza (inaczej historia została skorygowana, np. dywidendą).'''
+    # Ostatni zapisany słupek bywa niepełny (zapis w trakcie sesji) - porównujemy tylko zamknięte
+    common = cached.index[:-1].intersection(new_bars.index)
+    if common.empty: return True
+    return bool(np.allclose(cached.loc[common, 'Close'], new_bars.loc[common, 'Close'], rtol=1e-4, equal_nan=True))
+
+def cached_download(tickers, period='2y', interval='1d', threads=True, cache=None, refresh=False, errors=None, metrics=None):
+    '''Jak download_batch, ale z lokalnego magazynu dociąga tylko słupki po ostatnim zapisanym.'''
+    # Dane offline/syntetyczne nie trafiają do magazynu danych rynkowych
+    if not get_provider().cacheable: return download_batch(tickers, period=period, interval=interval, threads=threads, errors=errors, metrics=metrics)
+    cache = cache or get_default_cache()
+    frames, full, stale = {}, [], {}
+    # Jeden zapis indeksu magazynu na paczkę zamiast jednego na ticker
+    with cache.batch():
+        for t in tickers:
+            cached = cache.get(t, interval) if cache.covers(t, interval, period) else None
+            if cached is None or len(cached) < 2:
+                full.append(t)
+                continue
+            frames[t] = cached
+            if refresh or not cache.is_fresh(t, interval):
+                # Start od przedostatniego słupka: jeden pełny do weryfikacji + niepełny ostatni
+                stale.setdefault(cached.index[-2].strftime('%Y-%m-%d'), []).append(t)
+        count(metrics, 'cache_miss', len(full))
+        count(metrics, 'cache_refresh', sum(len(group) for group in stale.values()))
+        count(metrics, 'cache_hit', len(frames) - sum(len(group) for group in stale.values()))
+
+        for start, group in stale.items():
+            failed = {}
+            try:
+                fetched = download_batch(group, interval=interval, threads=threads, start=start, errors=failed, metrics=metrics)
+            except Exception:
+                continue  # Brak sieci - zostajemy przy danych z magazynu
+            for t in group:
+                if t in failed: continue  # Dane z magazynu, bez oznaczania jako świeże
+                new_bars = fetched.get(t)
+                if new_bars is not None and not _overlap_matches(frames[t], new_bars):
+                    cache.invalidate(t, interval)
+                    frames.pop(t)
+                    full.append(t)
+                else:
+                    frames[t] = cache.append(t, interval, new_bars)
+
+        if full:
+            fetched = download_batch(full, period=period, interval=interval, threads=threads, errors=errors, metrics=metrics)
+            for t in full:
+                frames[t] = fetched.get(t)
+                cache.put(t, interval, frames[t], period)
+    return {t: slice_period(frames.get(t), period) for t in tickers}
+
+WEEKLY_TREND_PERIOD = '5y'
+WEEKLY_SMA_BARS = 200
+HISTORY_SLACK = pd.Timedelta(days=7)  # dni bez sesji na początku okna
+RESAMPLE_RULES = {'1wk': ('W-MON', {'label': 'left', 'closed': 'left'}), '1mo': ('MS', {})}
+OHLCV_AGG = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Adj Close': 'last', 'Volume': 'sum'}
+
+def resample_ohlcv(df, interval='1wk'):
+    '''Buduje słupki wyższego interwału z dziennych (etykieta = początek okresu, jak w yfinance).'''
+    if df is None or df.empty: return None
+    rule, kwargs = RESAMPLE_RULES[interval]
+    agg = {c: f for c, f in OHLCV_AGG.items() if c in df.columns}
+    return df.resample(rule, **kwargs).agg(agg).dropna(subset=['Close'])
+
+def history_starts_inside(df, period):
+    '''Czy pierwszy słupek leży wewnątrz okna `period` (liczonego od ostatniego) - ticker ma po prostu krótszą historię.'''
+    offset = PERIOD_OFFSETS.get(period)
+    if offset is None: return True  # 'max' to już cała dostępna historia
+    return df.index[0] > df.index[-1] - offset + HISTORY_SLACK
+
+def load_timeframes(tickers, period='2y', interval='1d', threads=True, cache=None, refresh=False, errors=None, metrics=None):
+    '''Jedno pobranie na ticker: {ticker: (dane, słupki tygodniowe do FA-44 lub None)}; `errors` <- {ticker: status}.'''
+    if interval != '1d':
+        with timed(metrics, 'download'):
+            frames = cached_download(tickers, period=period, interval=interval, threads=threads, cache=cache, refresh=refresh, errors=errors, metrics=metrics)
+        return {t: (frames[t], None) for t in tickers}
+
+    # Historia dzienna min. 5y wystarcza na tygodniową SMA200 bez osobnego pobrania
+    fetch_period = period if period_covers(period, WEEKLY_TREND_PERIOD) else WEEKLY_TREND_PERIOD
+    with timed(metrics, 'download'):
+        daily = cached_download(tickers, period=fetch_period, interval='1d', threads=threads, cache=cache, refresh=refresh, errors=errors, metrics=metrics)
+    frames, short = {}, []
+    for t in tickers:
+        with timed(metrics, 'resample', t):
+            weekly = resample_ohlcv(daily[t], '1wk')
+        frames[t] = (slice_period(daily[t], period), weekly)
+        if daily[t] is None or (weekly is not None and len(weekly) >= WEEKLY_SMA_BARS): continue
+        # Młody ticker: osobne pobranie tygodniówek też nie da 200 słupków
+        if not daily[t].empty and history_starts_inside(daily[t], fetch_period): continue
+        short.append(t)
+
+    # Niepełna historia dzienna w magazynie - tygodniówki z osobnego pobrania
+    if short:
+        with timed(metrics, 'weekly_download'):
+            fallback = cached_download(short, period=WEEKLY_TREND_PERIOD, interval='1wk', threads=threads, cache=cache, metrics=metrics)
+        for t in short:
+            if fallback[t] is not None:
+                frames[t] = (frames[t][0], fallback[t])
+    return frames
+
+def weekly_trend_ok(w_data):
+    '''FA-44: Cena powyżej SMA200 na interwale tygodniowym (brak danych = brak filtra).'''
+    if w_data is None or w_data.empty or len(w_data) < 200: return True
+    w_sma200 = w_data['Close'].rolling(window=200).mean().iloc[-1]
+    return not float(w_data['Close'].iloc[-1]) < float(w_sma200)
+
+def analyze_ticker_data(ticker, data, w_data=None, interval=None, states=None, metrics=None, values=None):
+    '''Filtry trendu, struktura i cechy dla już pobranych danych (bez I/O); zwraca (ticker, ScanResult | None).
+
+    `values` - wartości końcowe tickera z ticker_values() policzone dla całej paczki; bez nich liczone tutaj.
+    '''
+    with timed(metrics, 'analyze', ticker):
+        return _analyze_ticker_data(ticker, data, w_data, interval, states, metrics, values)
+
+def _analyze_ticker_data(ticker, data, w_data, interval, states, metrics, values):
     try:
-        # FA-44: Walidacja trendu na interwale tygodniowym
-        if interval == '1d':
-            w_data = yf.download(ticker, period='5y', interval='1wk', progress=False)
-            if not w_data.empty and len(w_data) >= 200:
-                if isinstance(w_data.columns, pd.MultiIndex):
-                    w_data.columns = w_data.columns.get_level_values(0)
-                
-                w_sma200 = w_data['Close'].rolling(window=200).mean().iloc[-1]
-                if float(w_data['Close'].iloc[-1]) < float(w_sma200):
-                    return ticker, None
-
-        # Pobieranie danych głównych
-        data = yf.download(ticker, period=period, interval=interval, progress=False)
-        if data.empty: return ticker, None
-        
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)
+        if not weekly_trend_ok(w_data): return ticker, None
+        if data is None or data.empty: return ticker, None
             
-        struct = find_all_significant_lows(data)
+        # Struktura z zapisanego stanu, jeśli nowe słupki nie zmieniły okna HH
+        state = states.get(ticker, interval) if states is not None else None
+        struct, zone_set, new_state = incremental_structure(data, state, metrics=metrics, ticker=ticker)
+        if states is not None and new_state is not None and new_state is not state:
+            states.put(ticker, interval, new_state)
+
+        last_close = float(data['Close'].iloc[-1])
+        # FA-21/FA-43, FA-45..FA-48: wartości końcowe z silnika panelowego
+        if values is None: values = ticker_values({ticker: data})[ticker]
         if struct:
-            struct['clusters'] = find_clusters(struct)
-            last_close = float(data['Close'].iloc[-1])
-            
-            # FA-21/FA-43: SMA 200
-            sma200_series = data['Close'].rolling(window=200).mean()
-            if sma200_series.isna().iloc[-1]: return ticker, None
-            sma200 = float(sma200_series.iloc[-1])
-            
-            if last_close < sma200:
-                return ticker, None
-            
-            # --- FEATURE ENGINEERING (FA-42) ---
-            
-            # FA-45: ATR 14
-            high_low = data['High'] - data['Low']
-            high_pc = abs(data['High'] - data['Close'].shift())
-            low_pc = abs(data['Low'] - data['Close'].shift())
-            tr = pd.concat([high_low, high_pc, low_pc], axis=1).max(axis=1)
-            atr_val = float(tr.rolling(window=14).mean().iloc[-1])
-
-            # FA-46: RSI 14
-            delta = data['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi_val = float(100 - (100 / (1 + rs)).iloc[-1])
-
-            # FA-47: Odległość od SMA 200 (%)
-            dist_val = float((last_close - sma200) / sma200 * 100)
-
-            # FA-48: Nachylenie SMA 200
-            slope_val = 0.0
-            if len(sma200_series) >= 6:
-                prev_sma200 = float(sma200_series.iloc[-6])
-                slope_val = float((sma200 - prev_sma200) / prev_sma200 * 100)
-
-            # FA-49: Budowa wektora danych (Dataset Builder) - Zoptymalizowana precyzja
-            struct['data_vector'] = {
-                'ticker': ticker,
-                'last_price': round(last_close, 2),
-                'sma200': round(sma200, 2),
-                'sma200_dist_pct': round(dist_val, 2),
-                'sma200_slope_pct': round(slope_val, 4),
-                'rsi_14': round(rsi_val, 2),
-                'atr_14': round(atr_val, 2),
-                'n_hls': len(struct['hls']),
-                'max_cluster_score': round(struct['clusters'][0]['total_score'], 1) if struct['clusters'] else 0
-            }
-            
-            struct['trend'] = 'Wzrostowy'
-
-            # Generowanie sygnałów do UI
-            signals = []
-            active_zones = [z for z in struct['clusters'] if z['avg_price'] < last_close]
-            
-            if active_zones:
-                main_z = active_zones[0]
-                dist_to_fibo = (last_close - main_z['avg_price']) / last_close * 100
-                status = 'EKSTREMALNA' if main_z['total_score'] >= 8 else 'SILNA' if main_z['total_score'] >= 5 else 'STANDARDOWA'
-                signals.append(f"Najbliższa strefa: {main_z['avg_price']:.2f} ({status})")
-                signals.append(f"Dystans: {dist_to_fibo:.1f}%")
-                fibo_names = {l['type'] for l in main_z['levels']}
-                signals.append(f"Poziomy: {', '.join(fibo_names)}")
-            else:
-                signals.append('Brak aktywnych stref wsparcia.')
-            
-            struct['signals'] = signals
-            data.attrs['structure'] = struct
-            
-        return ticker, data
+            sma200 = float(values['sma200'])
+            if np.isnan(sma200) or last_close < sma200: return ticker, None
+        else:
+            zone_set = None
+
+        # FA-49: Budowa wektora danych (Dataset Builder) - Zoptymalizowana precyzja
+        with timed(metrics, 'features', ticker):
+            features = feature_row(values, zone_set)
+        return ticker, ScanResult(
+            ticker=ticker,
+            interval=interval,
+            last_ts=data.index[-1],
+            last_close=last_close,
+            n_bars=len(data),
+            features=features,
+            hh_price=struct['hh']['price'] if struct else None,
+            hh_date=struct['hh']['date'] if struct else None,
+            zones=zone_set,
+            main_zone=zone_set.first_below(last_close) if zone_set is not None else None
+        )
     except Exception as e:
-        return ticker, None
\ No newline at end of file
+        count(metrics, 'analysis_errors')
+        return ticker, None
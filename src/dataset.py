@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from src.analyzer import HH_WINDOW
+from src.backtest import causal_trend_filters, walk_structures, zone_outcomes, TOUCH_HORIZON
+from src.providers import get_provider, set_provider
+from src.fetcher import set_fetch_rate
+from src.cli import resolve_universe
+from src.indicators import indicator_series, FEATURE_ROUNDING
+from src.scanner import iter_downloads, DEFAULT_MAX_WORKERS, DEFAULT_BATCH_SIZE
+
+DATASET_DIR = 'data/dataset'
+N_BUCKETS = 64
+CONFIG_FILE = '_config.json'
+DONE_FILE = '_done.jsonl'
+
+# =============================================================================
+# SEKCHJA 1: WIERSZE FA-49 + ETYKIETY DLA JEDNEGO TICKERA
+# =============================================================================
+
+def ticker_rows(ticker, df, horizon=TOUCH_HORIZON, years=None):
+    '''Wektor FA-49 i etykiety przyszłych wyników dla każdego dnia historii tickera.'''
+    n = len(df)
+    first = HH_WINDOW if years is None else max(HH_WINDOW, n - int(years * 252))
+    if n <= first: return pd.DataFrame()
+    steps = np.arange(first, n)
+
+    # FA-45..FA-48 jako pełne serie (wartość w dniu t zależy tylko od danych do t)
+    series = indicator_series(df[['Close']], df[['High']], df[['Low']])
+    rows = {'ticker': ticker, 'date': df.index[steps]}
+    for name, digits in FEATURE_ROUNDING.items():
+        rows[name] = np.round(series[name].iloc[steps, 0].to_numpy(), digits)
+
+    n_hls = np.zeros(len(steps), dtype=np.int64)
+    max_score = np.zeros(len(steps))
+    zone_min = np.full(len(steps), np.nan)
+    zone_max = np.full(len(steps), np.nan)
+    zone_score = np.full(len(steps), np.nan)
+    close = df['Close'].to_numpy(dtype=float)
+    for k, (t, struct, zone_set) in enumerate(walk_structures(df, steps)):
+        if not struct: continue
+        n_hls[k] = len(struct['hls'])
+        if zone_set is None or not len(zone_set): continue
+        max_score[k] = round(float(zone_set.zones['total_score'][0]), 1)
+        z = zone_set.first_below(close[t])
+        if z is None: continue
+        zone_min[k], zone_max[k] = zone_set.zones['min_price'][z], zone_set.zones['max_price'][z]
+        zone_score[k] = zone_set.zones['total_score'][z]
+
+    rows.update({'n_hls': n_hls, 'max_cluster_score': max_score, 'trend_ok': causal_trend_filters(df)[steps], 'main_zone_score': zone_score})
+    table = pd.DataFrame(rows)
+    # Etykiety: stopy zwrotu i reakcja na strefę główną (NaN, gdy horyzont wychodzi poza dane)
+    for name, values in zone_outcomes(df, steps, zone_min, zone_max, horizon).items():
+        table[f'label_{name}'] = values
+    no_zone = np.isnan(zone_score)
+    for name in ('label_touched', 'label_held', 'label_bars_to_touch'):
+        table.loc[no_zone, name] = np.nan
+    return table
+
+# =============================================================================
+# SEKCHJA 2: ZAPIS PARTYCJONOWANY I WZNAWIANIE
+# =============================================================================
+
+def bucket_of(ticker):
+    return zlib.crc32(ticker.encode()) % N_BUCKETS
+
+def partition_path(out_dir, ticker):
+    return os.path.join(out_dir, f'bucket={bucket_of(ticker):02d}', f"{quote(ticker, safe='')}.parquet")
+
+def write_ticker(ticker, df, out_dir, horizon, years):
+    '''Uruchamiane w procesie roboczym: liczy wiersze i od razu zapisuje plik partycji.'''
+    table = ticker_rows(ticker, df, horizon, years)
+    if table.empty: return ticker, 0
+    path = partition_path(out_dir, ticker)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return ticker, len(table)
+
+def load_done(out_dir, config):
+    '''Tickery zapisane w poprzednim uruchomieniu; inna konfiguracja = błąd zamiast mieszania danych.'''
+    config_path = os.path.join(out_dir, CONFIG_FILE)
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved != config:
+            raise SystemExit(f'Zbiór w {out_dir} zbudowano z inną konfiguracją: {saved}')
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4)
+
+    done_path = os.path.join(out_dir, DONE_FILE)
+    if not os.path.exists(done_path): return set()
+    with open(done_path, 'r', encoding='utf-8') as f:
+        return {json.loads(line)['ticker'] for line in f if line.strip()}
+
+def build_dataset(tickers, out_dir=DATASET_DIR, period='max', horizon=TOUCH_HORIZON, years=None, workers=None,
+                  download_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+    '''Strumieniowo: paczka pobrań -> pula procesów -> plik partycji; w pamięci tylko bieżące paczki.'''
+    config = {'period': period, 'horizon': horizon, 'years': years, 'provider': get_provider().name}
+    done = load_done(out_dir, config)
+    todo = [t for t in tickers if t not in done]
+    max_in_flight = 2 * (workers or os.cpu_count() or 1)
+    written = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(os.path.join(out_dir, DONE_FILE), 'a', encoding='utf-8') as log:
+        pending = set()
+
+        def collect(futures):
+            nonlocal written
+            for future in futures:
+                try:
+                    ticker, n_rows = future.result()
+                except Exception:
+                    continue
+                written += n_rows
+                log.write(json.dumps({'ticker': ticker, 'rows': n_rows}) + '\n')
+                log.flush()
+
+        for frames in iter_downloads(todo, period, '1d', download_workers, batch_size):
+            for t, (data, _) in frames.items():
+                if data is None: continue
+                # Ograniczenie liczby ramek czekających w kolejce puli
+                while len(pending) >= max_in_flight:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                pending.add(pool.submit(write_ticker, t, data, out_dir, horizon, years))
+        finished, _ = wait(pending)
+        collect(finished)
+    return len(todo), written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.dataset', description='Budowa zbioru uczącego FA-49 (Parquet partycjonowany).')
+    parser.add_argument('--preset', action='append', default=[])
+    parser.add_argument('--all-presets', action='store_true')
+    parser.add_argument('--tickers-file')
+    parser.add_argument('--tickers')
+    parser.add_argument('--period', default='max', choices=['2y', '5y', '10y', 'max'])
+    parser.add_argument('--years', type=float, help='Tylko ostatnie N lat historii (domyślnie całość)')
+    parser.add_argument('--horizon', type=int, default=TOUCH_HORIZON)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rate', type=float, help='Limit zapytań/s do źródła danych (domyślnie $FIBO_FETCH_RATE lub 4)')
+    parser.add_argument('--provider', default=None, help='yahoo | store[:katalog] | replay[:katalog] | synthetic[:seed]')
+    parser.add_argument('--output-dir', default=DATASET_DIR)
+    args = parser.parse_args(argv)
+    if args.provider: set_provider(args.provider)
+    if args.rate: set_fetch_rate(args.rate)
+
+    tickers = resolve_universe(args.preset, args.all_presets, args.tickers_file, args.tickers)
+    start = time.perf_counter()
+    processed, rows = build_dataset(tickers, args.output_dir, args.period, args.horizon, args.years, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f'Przetworzono {processed} tickerów ({len(tickers) - processed} już gotowych), {rows} wierszy w {elapsed:.1f}s -> {args.output_dir}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
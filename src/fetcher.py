@@ -0,0 +1,263 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import yfinance as yf
+from src.metrics import timed, count
+
+DEFAULT_RATE = 4.0  # zapytań na sekundę (średnio)
+RATE_ENV = 'FIBO_FETCH_RATE'  # nadpisuje DEFAULT_RATE (np. worker pre-skanu, CI)
+DEFAULT_BURST = 8
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 10
+
+# Status pobrania tickera -> opis dla UI/CLI ('ok' nie trafia do słownika błędów)
+FETCH_STATUSES = {
+    'no_data': 'brak danych',
+    'rate_limited': 'limit zapytań (HTTP 429)',
+    'timeout': 'przekroczony czas',
+    'network': 'błąd sieci',
+    'http_error': 'błąd HTTP',
+    'error': 'nieznany błąd'
+}
+RETRYABLE_STATUSES = {'rate_limited', 'timeout', 'network'}
+
+TIMEOUT_ERRORS = {'Timeout', 'TimeoutError', 'ConnectTimeout', 'ReadTimeout', 'timeout'}
+NETWORK_ERRORS = {'ConnectionError', 'ChunkedEncodingError', 'RemoteDisconnected', 'ConnectionResetError', 'ProxyError', 'SSLError'}
+NO_DATA_ERRORS = {'YFTickerMissingError', 'YFPricesMissingError', 'YFTzMissingError', 'YFInvalidPeriodError'}
+
+# =============================================================================
+# SEKCHJA 1: KLASYFIKACJA BŁĘDÓW
+# =============================================================================
+
+class FetchError(Exception):
+    '''Błąd pobrania z jawnym statusem (np. z zastępczego backendu).'''
+
+    def __init__(self, status, message='', retry_after=None):
+        super().__init__(message or FETCH_STATUSES.get(status, status))
+        self.status = status
+        self.retry_after = retry_after
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def classify_error(exc):
+    '''(status, sugerowane opóźnienie z Retry-After | None) dla wyjątku pobierania.'''
+    if isinstance(exc, FetchError): return exc.status, exc.retry_after
+    # Po nazwie typu - requests, curl_cffi i yfinance mają własne hierarchie wyjątków
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if 'YFRateLimitError' in names: return 'rate_limited', None
+    if names & NO_DATA_ERRORS: return 'no_data', None
+    response = getattr(exc, 'response', None)
+    code = getattr(response, 'status_code', None)
+    if code == 429: return 'rate_limited', _retry_after(response)
+    if code is not None and code >= 500: return 'network', _retry_after(response)
+    if code is not None: return 'http_error', None
+    if names & TIMEOUT_ERRORS or 'timed out' in str(exc).lower(): return 'timeout', None
+    if names & NETWORK_ERRORS or isinstance(exc, OSError): return 'network', None
+    return 'error', None
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    '''Wykładnicze opóźnienie z losowym rozrzutem (połowa stała, połowa losowa).'''
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# =============================================================================
+# SEKCHJA 2: LIMIT TEMPA I ADAPTACYJNA WSPÓŁBIEŻNOŚĆ
+# =============================================================================
+
+class TokenBucket:
+    '''Limit zapytań/s wspólny dla wszystkich wątków; `pause` wstrzymuje wszystkich po 429.'''
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        '''Nowe tempo od teraz; żetony narosłe dotąd liczone jeszcze po starym.'''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.rate = max(rate, 0.01)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+class AdaptiveLimit:
+    '''Limit równoległych zapytań AIMD: +1 po serii sukcesów, połowa po 429.'''
+
+    def __init__(self, limit=DEFAULT_CONCURRENCY, minimum=1):
+        self.maximum = limit
+        self.minimum = minimum
+        self.limit = float(limit)
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def resize(self, maximum):
+        '''Nowy pułap (np. suwak w UI); bieżący limit dochodzi do niego stopniowo.'''
+        with self._cond:
+            self.maximum = max(self.minimum, maximum)
+            self.limit = min(self.limit, self.maximum)
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self._active -= 1
+            if throttled: self.limit = max(self.minimum, self.limit / 2)
+            else: self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+# =============================================================================
+# SEKCHJA 3: HARMONOGRAM POBIERANIA
+# =============================================================================
+
+_session = None
+_session_lock = threading.Lock()
+_transfer = threading.local()
+
+def thread_bytes():
+    '''Bajty odpowiedzi odebrane dotąd przez bieżący wątek (yfinance pobiera synchronicznie w wątku wołającym).'''
+    return getattr(_transfer, 'bytes', 0)
+
+def _counting(session_cls):
+    # Podklasa, nie opakowanie - yfinance akceptuje tylko sesje curl_cffi/requests
+    class CountingSession(session_cls):
+        def request(self, *args, **kwargs):
+            response = super().request(*args, **kwargs)
+            _transfer.bytes = thread_bytes() + len(response.content or b'')
+            return response
+    return CountingSession
+
+def get_session():
+    '''Jedna sesja HTTP (pula połączeń) na proces; curl_cffi jak domyślnie w yfinance.'''
+    global _session
+    with _session_lock:
+        if _session is None:
+            try:
+                from curl_cffi import requests as curl_requests
+                _session = _counting(curl_requests.Session)(impersonate='chrome')
+            except ImportError:
+                import requests
+                _session = _counting(requests.Session)()
+        return _session
+
+# yfinance >= 1.0 steruje rzucaniem wyjątków globalnie, starsze wersje przez raise_errors
+if hasattr(yf, 'config'): yf.config.debug.hide_exceptions = False
+HISTORY_KWARGS = {} if hasattr(yf, 'config') else {'raise_errors': True}
+
+def yahoo_history(ticker, session=None, period='2y', interval='1d', start=None, timeout=REQUEST_TIMEOUT):
+    '''Jedno zapytanie o historię tickera; błędy jako wyjątki (do klasyfikacji).'''
+    window = {'start': start} if start is not None else {'period': period}
+    data = yf.Ticker(ticker, session=session).history(interval=interval, auto_adjust=True, actions=False, timeout=timeout, **window, **HISTORY_KWARGS)
+    if data is None or data.empty: return None
+    # Jak yf.download dla interwałów dziennych i dłuższych: indeks bez strefy czasowej
+    if interval[-1] not in ('m', 'h') and data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    return data
+
+class FetchScheduler:
+    '''Pobieranie tickerów przez wspólny limit tempa, adaptacyjną współbieżność i ponowienia z backoffem.'''
+
+    def __init__(self, fetch_one=yahoo_history, session=None, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 concurrency=DEFAULT_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES, backoff_base=BACKOFF_BASE):
+        self.fetch_one = fetch_one
+        self.session = session
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = AdaptiveLimit(concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def fetch_ticker(self, ticker, metrics=None, **window):
+        '''(dane | None, status | None); status None = sukces.'''
+        with timed(metrics, 'http', ticker):
+            received = thread_bytes()
+            try:
+                return self._fetch_ticker(ticker, metrics, **window)
+            finally:
+                count(metrics, 'bytes_downloaded', thread_bytes() - received)
+
+    def _fetch_ticker(self, ticker, metrics, **window):
+        session = self.session or get_session()
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.limit.acquire()
+            count(metrics, 'requests')
+            if attempt: count(metrics, 'retries')
+            status = retry_after = None
+            try:
+                data = self.fetch_one(ticker, session=session, **window)
+            except Exception as e:
+                status, retry_after = classify_error(e)
+            finally:
+                self.limit.release(throttled=status == 'rate_limited')
+
+            if status is None: return (data, None) if data is not None and not data.empty else (None, 'no_data')
+            if status not in RETRYABLE_STATUSES or attempt == self.max_retries: return None, status
+            # Retry-After od serwera też ograniczony sufitem backoffu - jeden nagłówek nie zawiesza skanu
+            delay = min(retry_after, BACKOFF_MAX) if retry_after and retry_after > 0 else backoff_delay(attempt, self.backoff_base)
+            # 429 dotyczy całego klienta - wstrzymujemy wszystkie wątki, nie tylko ten
+            if status == 'rate_limited': self.bucket.pause(delay)
+            time.sleep(delay)
+
+    def fetch(self, tickers, max_workers=None, metrics=None, **window):
+        '''({ticker: dane | None}, {ticker: status błędu}) dla listy tickerów.'''
+        tickers = list(tickers)
+        if not tickers: return {}, {}
+        if max_workers: self.limit.resize(max_workers)
+        workers = min(len(tickers), self.limit.maximum)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda t: self.fetch_ticker(t, metrics, **window), tickers))
+        frames = {t: data for t, (data, _) in zip(tickers, results)}
+        errors = {t: status for t, (_, status) in zip(tickers, results) if status is not None}
+        return frames, errors
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+def default_rate():
+    '''Tempo z FIBO_FETCH_RATE, a bez niej DEFAULT_RATE.'''
+    return float(os.environ.get(RATE_ENV) or DEFAULT_RATE)
+
+def get_fetch_scheduler():
+    '''Wspólny harmonogram procesu - limit tempa obejmuje wszystkie sesje i wątki.'''
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = FetchScheduler(rate=default_rate())
+        return _default_scheduler
+
+def set_fetch_rate(rate):
+    '''Zmiana limitu zapytań/s wspólnego harmonogramu (--rate w CLI, ustawienie w UI).'''
+    get_fetch_scheduler().bucket.set_rate(rate)
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+SMA_WINDOW = 200
+SLOPE_LAG = 5
+ATR_WINDOW = 14
+RSI_WINDOW = 14
+
+# Kolumny FA-49 i precyzja zaokrąglenia (jak w data_vector)
+FEATURE_ROUNDING = {
+    'last_price': 2,
+    'sma200': 2,
+    'sma200_dist_pct': 2,
+    'sma200_slope_pct': 4,
+    'rsi_14': 2,
+    'atr_14': 2
+}
+FEATURE_COLUMNS = ['ticker'] + list(FEATURE_ROUNDING) + ['n_hls', 'max_cluster_score']
+
+# Ile ostatnich słupków wystarcza do wartości końcowych (SMA200 sprzed 5 sesji)
+LAST_VALUE_BARS = SMA_WINDOW + SLOPE_LAG
+
+# =============================================================================
+# SEKCHJA 1: PANELE CENOWE (TICKERY x CZAS)
+# =============================================================================
+
+def stack_panel(frames, column, length=None):
+    '''Tablica tickery x słupki wyrównana do ostatniego słupka (brakująca historia = NaN).'''
+    length = length or max((len(df) for df in frames.values() if df is not None), default=0)
+    panel = np.full((len(frames), length), np.nan)
+    for row, df in enumerate(frames.values()):
+        if df is None or df.empty: continue
+        values = df[column].to_numpy(dtype=float)[-length:]
+        panel[row, length - len(values):] = values
+    return panel
+
+def bar_counts(frames):
+    return np.array([0 if df is None else len(df) for df in frames.values()])
+
+def _true_range(high, low, close):
+    '''FA-45: max(H-L, |H-Cprev|, |L-Cprev|) z pomijaniem NaN jak w pandas.'''
+    prev_close = np.concatenate([np.full((close.shape[0], 1), np.nan), close[:, :-1]], axis=1)
+    return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+def _gains_losses(close):
+    '''FA-46: zmiany dodatnie/ujemne; brak zmiany (NaN) liczy się jako 0.'''
+    delta = np.diff(close, axis=1, prepend=np.nan)
+    return np.where(delta > 0, delta, 0.0), np.where(delta < 0, -delta, 0.0)
+
+def _rsi(gain, loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain / loss)
+
+# =============================================================================
+# SEKCHJA 2: WARTOŚCI KOŃCOWE (BEZ MATERIALIZACJI SERII)
+# =============================================================================
+
+def last_indicators(close, high, low, n_bars=None):
+    '''Wskaźniki FA-45..FA-48 tylko dla ostatniego słupka, jednym przebiegiem po panelu.'''
+    n_bars = np.full(close.shape[0], close.shape[1]) if n_bars is None else np.asarray(n_bars)
+    with np.errstate(invalid='ignore'):
+        last_close = close[:, -1]
+        sma200 = close[:, -SMA_WINDOW:].mean(axis=1) if close.shape[1] >= SMA_WINDOW else np.full(len(close), np.nan)
+        sma200 = np.where(n_bars >= SMA_WINDOW, sma200, np.nan)
+        prev_sma200 = np.full(len(close), np.nan)
+        if close.shape[1] >= LAST_VALUE_BARS:
+            prev_sma200 = close[:, -LAST_VALUE_BARS:-SLOPE_LAG].mean(axis=1)
+        prev_sma200 = np.where(n_bars >= LAST_VALUE_BARS, prev_sma200, np.nan)
+
+        tail = slice(-(ATR_WINDOW + 1), None)
+        atr = _true_range(high[:, tail], low[:, tail], close[:, tail])[:, 1:].mean(axis=1)
+        gain, loss = _gains_losses(close[:, tail])
+        rsi = _rsi(gain[:, 1:].mean(axis=1), loss[:, 1:].mean(axis=1))
+        short = n_bars < RSI_WINDOW
+        atr[short], rsi[short] = np.nan, np.nan
+
+        return {
+            'last_price': last_close,
+            'sma200': sma200,
+            'sma200_dist_pct': (last_close - sma200) / sma200 * 100,
+            'sma200_slope_pct': (sma200 - prev_sma200) / prev_sma200 * 100,
+            'rsi_14': rsi,
+            'atr_14': atr
+        }
+
+# =============================================================================
+# SEKCHJA 3: PEŁNE SERIE (DATASET / BACKTEST)
+# =============================================================================
+
+def indicator_series(close, high, low):
+    '''Pełne serie FA-45..FA-48 dla paneli DataFrame (czas x tickery) - jeden przebieg rolling.'''
+    sma200 = close.rolling(SMA_WINDOW).mean()
+    tr = pd.DataFrame(_true_range(high.to_numpy(dtype=float).T, low.to_numpy(dtype=float).T, close.to_numpy(dtype=float).T).T,
+                      index=close.index, columns=close.columns)
+    gain, loss = _gains_losses(close.to_numpy(dtype=float).T)
+    mean_gain = pd.DataFrame(gain.T, index=close.index, columns=close.columns).rolling(RSI_WINDOW).mean()
+    mean_loss = pd.DataFrame(loss.T, index=close.index, columns=close.columns).rolling(RSI_WINDOW).mean()
+    prev_sma200 = sma200.shift(SLOPE_LAG)
+    return {
+        'last_price': close,
+        'sma200': sma200,
+        'sma200_dist_pct': (close - sma200) / sma200 * 100,
+        'sma200_slope_pct': (sma200 - prev_sma200) / prev_sma200 * 100,
+        'rsi_14': pd.DataFrame(_rsi(mean_gain.to_numpy(), mean_loss.to_numpy()), index=close.index, columns=close.columns),
+        'atr_14': tr.rolling(ATR_WINDOW).mean()
+    }
+
+# =============================================================================
+# SEKCHJA 4: CECHY FA-49 Z PANELU PACZKI
+# =============================================================================
+
+def _structure_values(zone_set):
+    '''n_hls i max_cluster_score z ZoneSet (brak struktury = zera).'''
+    if zone_set is None: return 0, 0
+    return zone_set.n_hls, round(float(zone_set.zones['total_score'][0]), 1) if len(zone_set) else 0
+
+def last_value_features(frames):
+    '''Surowe (niezaokrąglone) wartości końcowe dla słownika {ticker: OHLCV}.'''
+    panels = {c: stack_panel(frames, c, LAST_VALUE_BARS) for c in ('Close', 'High', 'Low')}
+    return last_indicators(panels['Close'], panels['High'], panels['Low'], bar_counts(frames))
+
+def ticker_values(frames):
+    '''Wartości końcowe całej paczki jednym przebiegiem, rozdzielone na {ticker: {nazwa: wartość}}.'''
+    frames = {t: df for t, df in frames.items() if df is not None and not df.empty}
+    values = last_value_features(frames)
+    return {t: {name: column[row] for name, column in values.items()} for row, t in enumerate(frames)}
+
+def feature_row(values, zone_set=None):
+    '''Wartości FEATURE_COLUMNS bez tickera dla jednego tickera (`values` z ticker_values) - bez DataFrame.'''
+    rounded = tuple(float(np.round(values[name], digits)) for name, digits in FEATURE_ROUNDING.items())
+    return rounded + _structure_values(zone_set)
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+
+# Etapy skanu w kolejności wyświetlania; 'download'/'weekly_download' mierzone na paczkę, pozostałe na ticker
+STAGE_LABELS = {
+    'download': 'Pobieranie danych',
+    'weekly_download': 'Pobieranie tygodniówek (FA-44)',
+    'http': 'Zapytania HTTP (z ponowieniami)',
+    'resample': 'Tygodniówki z dziennych',
+    'structure': 'Dołki HL (struktura)',
+    'clustering': 'Klastry Fibo',
+    'features': 'Cechy FA-49',
+    'analyze': 'Analiza tickera (razem)',
+    'render': 'Karty i postęp w UI',
+    'commentary': 'Komentarze AI'
+}
+COUNTER_LABELS = {
+    'cache_hit': 'Cache OHLCV: trafienia',
+    'cache_miss': 'Cache OHLCV: chybienia',
+    'cache_refresh': 'Cache OHLCV: dociągnięcia',
+    'result_hit': 'Gotowe wyniki',
+    'structure_reuse': 'Struktura z zapisanego stanu',
+    'requests': 'Zapytania HTTP',
+    'retries': 'Ponowienia',
+    'bytes_downloaded': 'Pobrane bajty',
+    'fetch_errors': 'Błędy pobrania',
+    'analysis_errors': 'Błędy analizy'
+}
+# Etapy, które się nie zawierają - ich suma to czas tickera ('analyze' obejmuje strukturę, klastry i cechy)
+TICKER_TOTAL_STAGES = ('http', 'resample', 'analyze', 'render')
+SLOWEST_TICKERS = 10
+
+# =============================================================================
+# SEKCHJA 1: LICZNIKI I CZASY JEDNEGO SKANU
+# =============================================================================
+
+class ScanMetrics:
+    '''Czasy etapów (łącznie i per ticker) oraz liczniki jednego skanu; bezpieczne dla wątków.'''
+
+    def __init__(self, label=None):
+        self.label = label
+        self.started_at = time.time()
+        self.wall = None
+        self.stages = {}  # etap -> [wywołania, suma s, max s]
+        self.tickers = {}  # ticker -> {etap: suma s}
+        self.counters = Counter()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds, ticker=None):
+        with self._lock:
+            calls, total, longest = self.stages.get(stage, (0, 0.0, 0.0))
+            self.stages[stage] = [calls + 1, total + seconds, max(longest, seconds)]
+            if ticker is not None:
+                per_ticker = self.tickers.setdefault(ticker, {})
+                per_ticker[stage] = per_ticker.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage, ticker=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, ticker)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def snapshot(self):
+        '''Czasy per ticker i liczniki jako zwykłe słowniki - do przesłania z procesu roboczego.'''
+        with self._lock:
+            return {t: dict(stages) for t, stages in self.tickers.items()}, dict(self.counters)
+
+    def merge(self, snapshot):
+        tickers, counters = snapshot
+        for t, stages in tickers.items():
+            for stage, seconds in stages.items():
+                self.add_time(stage, seconds, t)
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def finish(self):
+        self.wall = time.perf_counter() - self._start
+        return self
+
+    def stage_table(self):
+        '''Etap, liczba wywołań, suma, średnia i max (ms) oraz udział w czasie skanu.'''
+        wall = self.wall or time.perf_counter() - self._start
+        with self._lock:
+            items = sorted(self.stages.items(), key=lambda kv: list(STAGE_LABELS).index(kv[0]) if kv[0] in STAGE_LABELS else len(STAGE_LABELS))
+        rows = [{
+            'stage': stage,
+            'label': STAGE_LABELS.get(stage, stage),
+            'calls': calls,
+            'total_s': round(total, 3),
+            'mean_ms': round(total / calls * 1000, 2),
+            'max_ms': round(longest * 1000, 2),
+            # Etapy na puli wątków nakładają się, więc suma udziałów może przekraczać 100%
+            'share': round(total / wall, 3) if wall else None
+        } for stage, (calls, total, longest) in items]
+        return pd.DataFrame(rows, columns=['stage', 'label', 'calls', 'total_s', 'mean_ms', 'max_ms', 'share'])
+
+    def slowest_tickers(self, n=SLOWEST_TICKERS):
+        '''Tickery z najdłuższym łącznym czasem etapów per ticker.'''
+        with self._lock:
+            rows = [{'ticker': t, 'total_s': sum(stages.get(s, 0.0) for s in TICKER_TOTAL_STAGES), **stages} for t, stages in self.tickers.items()]
+        if not rows: return pd.DataFrame(columns=['ticker', 'total_s'])
+        table = pd.DataFrame(rows).fillna(0.0).sort_values('total_s', ascending=False).head(n)
+        return table.round(4).reset_index(drop=True)
+
+    def to_dict(self):
+        with self._lock:
+            counters = dict(self.counters)
+            tickers = {t: {s: round(v, 6) for s, v in stages.items()} for t, stages in self.tickers.items()}
+        return {
+            'label': self.label,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'wall_s': round(self.wall, 3) if self.wall is not None else None,
+            'stages': self.stage_table().drop(columns='label').to_dict(orient='records'),
+            'counters': counters,
+            'tickers': tickers
+        }
+
+    def to_json(self, indent=4):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix='fibo_scan'):
+        '''Format tekstowy Prometheusa (np. dla node_exporter textfile collector); każda rodzina metryk w jednym bloku.'''
+        with self._lock:
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+        families = [
+            ('stage_seconds_total', 'counter', 'Łączny czas etapu skanu', [(f'{{stage="{s}"}}', f'{total:.6f}') for s, (_, total, _) in stages.items()]),
+            ('stage_calls_total', 'counter', 'Liczba pomiarów etapu skanu', [(f'{{stage="{s}"}}', calls) for s, (calls, _, _) in stages.items()]),
+            ('stage_max_seconds', 'gauge', 'Najdłuższy pojedynczy pomiar etapu', [(f'{{stage="{s}"}}', f'{longest:.6f}') for s, (_, _, longest) in stages.items()])
+        ]
+        families += [(f'{name}_total', 'counter', COUNTER_LABELS.get(name, name), [('', value)]) for name, value in sorted(counters.items())]
+        if self.wall is not None: families.append(('wall_seconds', 'gauge', 'Czas całego skanu', [('', f'{self.wall:.6f}')]))
+
+        lines = []
+        for name, kind, help_text, samples in families:
+            if not samples: continue
+            lines += [f'# HELP {prefix}_{name} {help_text}', f'# TYPE {prefix}_{name} {kind}']
+            lines += [f'{prefix}_{name}{labels} {value}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+# =============================================================================
+# SEKCHJA 2: POMOCNICZE DLA KODU Z OPCJONALNYMI METRYKAMI
+# =============================================================================
+# Funkcje skanu przyjmują metrics=None jak errors=None - bez obiektu pomiar nic nie kosztuje.
+
+def timed(metrics, stage, ticker=None):
+    return metrics.timer(stage, ticker) if metrics is not None else nullcontext()
+
+def count(metrics, name, n=1):
+    if metrics is not None and n: metrics.count(name, n)
+
+def write_metrics(metrics, path, fmt=None):
+    '''Zapis do pliku; format z rozszerzenia (.prom = Prometheus, inaczej JSON).'''
+    fmt = fmt or ('prometheus' if path.endswith('.prom') else 'json')
+    text = metrics.to_prometheus() if fmt == 'prometheus' else metrics.to_json()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
@@ -0,0 +1,81 @@
+import pickle
+from dataclasses import dataclass
+import pandas as pd
+from src.analyzer import ZoneSet
+from src.fetcher import FETCH_STATUSES
+from src.indicators import FEATURE_COLUMNS
+
+# =============================================================================
+# SEKCHJA 1: STATUS STREFY
+# =============================================================================
+
+ZONE_STATUSES = ['EKSTREMALNA', 'SILNA', 'STANDARDOWA']
+
+def zone_status(total_score):
+    '''Poziom siły strefy wyświetlany w sygnałach i filtrach UI.'''
+    return 'EKSTREMALNA' if total_score >= 8 else 'SILNA' if total_score >= 5 else 'STANDARDOWA'
+
+# =============================================================================
+# SEKCHJA 2: KOMPAKTOWY WYNIK ANALIZY TICKERA
+# =============================================================================
+
+@dataclass(slots=True)
+class ScanResult:
+    '''Wynik analizy bez ramki OHLCV: strefy jako tablice ZoneSet, cechy FA-49 jako krotka.'''
+    ticker: str
+    interval: str
+    last_ts: pd.Timestamp
+    last_close: float
+    n_bars: int
+    features: tuple = None  # Wartości FEATURE_COLUMNS bez tickera
+    hh_price: float = None
+    hh_date: pd.Timestamp = None
+    zones: ZoneSet = None  # None = brak struktury HH/HL
+    main_zone: int = None  # Indeks najsilniejszej strefy poniżej ceny
+
+    @property
+    def data_vector(self):
+        '''FA-49 jako słownik (jak dawne struct['data_vector']).'''
+        if self.features is None: return None
+        return dict(zip(FEATURE_COLUMNS, (self.ticker,) + self.features))
+
+    @property
+    def trend(self):
+        return 'Wzrostowy' if self.zones is not None else None
+
+    def zone(self, z=None, with_levels=False):
+        '''Słownik strefy `z` (domyślnie głównej) budowany z tablic.'''
+        z = self.main_zone if z is None else z
+        return None if z is None else self.zones.zone(z, with_levels)
+
+    @property
+    def signals(self):
+        '''Opis strefy głównej dla karty - liczony z tablic przy wyświetleniu.'''
+        if self.zones is None: return []
+        if self.main_zone is None: return ['Brak aktywnych stref wsparcia.']
+        main_z = self.zone()
+        dist_to_fibo = (self.last_close - main_z['avg_price']) / self.last_close * 100
+        return [
+            f"Najbliższa strefa: {main_z['avg_price']:.2f} ({zone_status(main_z['total_score'])})",
+            f"Dystans: {dist_to_fibo:.1f}%",
+            f"Poziomy: {', '.join(self.zones.level_types(self.main_zone))}"
+        ]
+
+    def to_bytes(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def from_bytes(blob):
+        result = pickle.loads(blob)
+        if not isinstance(result, ScanResult): raise TypeError(f'Oczekiwano ScanResult, otrzymano {type(result).__name__}')
+        return result
+
+@dataclass(slots=True)
+class FetchFailure:
+    '''Ticker bez danych przez błąd pobrania (429, timeout...) - nie mylić z odrzuceniem przez filtry trendu.'''
+    ticker: str
+    status: str
+
+    @property
+    def label(self):
+        return FETCH_STATUSES.get(self.status, self.status)
@@ -0,0 +1,300 @@
+import argparse
+import datetime as dt
+import glob
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from src.cache import CACHE_DIR, get_default_cache
+from src.metrics import ScanMetrics
+from src.models import FetchFailure
+from src.providers import get_provider, set_provider
+from src.scanner import iter_scan
+from src.utils import load_presets
+
+logger = logging.getLogger(__name__)
+
+PRESCAN_CONFIG = 'data/prescan.json'
+PRESCAN_DIR = os.path.join(CACHE_DIR, 'prescan')
+PRESCAN_ENV = 'FIBO_PRESCAN'  # "0" = aplikacja nie uruchamia workera
+DEFAULT_CONFIG = {
+    'enabled': True,
+    'times': ['22:30'],  # czas lokalny serwera, po zamknięciu sesji
+    'weekdays': [0, 1, 2, 3, 4],
+    'intervals': ['1d', '1wk'],
+    'periods': ['5y'],
+    'fresh_until': '09:00'  # dane z pre-skanu świeże do tej godziny następnego dnia sesyjnego
+}
+CLAIM_TTL = 15 * 60  # właściciel bez heartbeatu dłużej = porzucony slot
+HEARTBEAT_EVERY = 30
+POLL_INTERVAL = 60
+KEEP_DAYS = 7
+
+# =============================================================================
+# SEKCHJA 1: KONFIGURACJA I HARMONOGRAM
+# =============================================================================
+
+def load_config(path=PRESCAN_CONFIG):
+    '''DEFAULT_CONFIG nadpisany plikiem JSON (brak pliku = domyślne).'''
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+def _at(day, hhmm):
+    hours, minutes = map(int, hhmm.split(':'))
+    return dt.datetime.combine(day, dt.time(hours, minutes))
+
+def slot_id(when):
+    return when.strftime('%Y-%m-%d_%H%M')
+
+def current_slot(config, now=None):
+    '''Ostatni minięty dziś termin (wcześniejsze zawiera) albo None poza dniami z harmonogramu.'''
+    now = now or dt.datetime.now()
+    if now.weekday() not in config['weekdays']: return None
+    passed = [t for t in (_at(now.date(), hhmm) for hhmm in config['times']) if t <= now]
+    return slot_id(max(passed)) if passed else None
+
+def fresh_until(config, now=None):
+    '''Timestamp `fresh_until` najbliższego dnia z harmonogramu po dzisiejszym (piątek -> poniedziałek).'''
+    now = now or dt.datetime.now()
+    day = now.date() + dt.timedelta(days=1)
+    while day.weekday() not in config['weekdays']:
+        day += dt.timedelta(days=1)
+    return _at(day, config['fresh_until']).timestamp()
+
+# =============================================================================
+# SEKCHJA 2: KOORDYNACJA MIĘDZY INSTANCJAMI (BEZ BLOKAD)
+# =============================================================================
+# Slot ma pliki `<slot>.claim.<n>` tworzone atomowo (O_CREAT | O_EXCL) - tylko jeden proces wygrywa
+# generację n. Właściciel odświeża mtime (heartbeat); po CLAIM_TTL bez niego inny proces przejmuje slot
+# generacją n+1, a poprzedni właściciel przerywa, widząc nowszy plik. Koniec = `<slot>.done` z podsumowaniem.
+
+class SlotClaim:
+    '''Własność jednego terminu pre-skanu; działa między procesami i instancjami na wspólnym dysku.'''
+
+    def __init__(self, slot, path, generation, root):
+        self.slot = slot
+        self.path = path
+        self.generation = generation
+        self.root = root
+        self._beat = time.time()
+
+    @staticmethod
+    def done_path(slot, root=PRESCAN_DIR):
+        return os.path.join(root, f'{slot}.done')
+
+    @staticmethod
+    def _generations(slot, root):
+        gens = {}
+        for path in glob.glob(os.path.join(root, f'{glob.escape(slot)}.claim.*')):
+            try:
+                gens[int(path.rsplit('.', 1)[1])] = path
+            except ValueError:
+                pass
+        return gens
+
+    @classmethod
+    def acquire(cls, slot, root=PRESCAN_DIR, ttl=CLAIM_TTL):
+        '''Zwraca SlotClaim albo None (slot zrobiony, trwa w innym procesie lub przegrany wyścig).'''
+        os.makedirs(root, exist_ok=True)
+        if os.path.exists(cls.done_path(slot, root)): return None
+        gens = cls._generations(slot, root)
+        generation = 0
+        if gens:
+            latest = max(gens)
+            try:
+                if time.time() - os.stat(gens[latest]).st_mtime < ttl: return None
+            except OSError:
+                pass  # Właściciel właśnie skończył lub sprzątnął - następna generacja i tak jest bezpieczna
+            generation = latest + 1
+        path = os.path.join(root, f'{slot}.claim.{generation}')
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'claimed_at': time.time()}, f)
+        # Ukończony między sprawdzeniem a utworzeniem pliku
+        if os.path.exists(cls.done_path(slot, root)):
+            os.remove(path)
+            return None
+        return cls(slot, path, generation, root)
+
+    def heartbeat(self):
+        '''Odświeża własność (najwyżej co HEARTBEAT_EVERY s); False = slot przejęty, trzeba przerwać.'''
+        if time.time() - self._beat < HEARTBEAT_EVERY: return True
+        if max(self._generations(self.slot, self.root), default=-1) > self.generation: return False
+        try:
+            os.utime(self.path)
+        except OSError:
+            return False
+        self._beat = time.time()
+        return True
+
+    def release(self, summary):
+        path = self.done_path(self.slot, self.root)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+        os.replace(tmp_path, path)
+        for claim in self._generations(self.slot, self.root).values():
+            try:
+                os.remove(claim)
+            except OSError:
+                pass
+
+def cleanup(root=PRESCAN_DIR, keep_days=KEEP_DAYS):
+    '''Usuwa znaczniki slotów starszych niż `keep_days` dni.'''
+    cutoff = time.time() - keep_days * 24 * 3600
+    for path in glob.glob(os.path.join(root, '*')):
+        try:
+            if os.stat(path).st_mtime < cutoff: os.remove(path)
+        except OSError:
+            pass
+
+def last_prescan(root=PRESCAN_DIR):
+    '''Podsumowanie ostatniego ukończonego pre-skanu (dowolnej instancji) albo None.'''
+    done = glob.glob(os.path.join(root, '*.done'))
+    if not done: return None
+    try:
+        with open(max(done, key=os.path.getmtime), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# =============================================================================
+# SEKCHJA 3: PRE-SKAN WSZYSTKICH PRESETÓW
+# =============================================================================
+
+def prescan_universe():
+    return sorted({t for tickers in load_presets().values() for t in tickers})
+
+def run_prescan(config, cache=None, result_store=None, heartbeat=None, metrics=None, now=None):
+    '''Skan wszystkich presetów dla każdego interwału i okresu z configu; wyniki trafiają do wspólnego
+    magazynu wyników, a pobrane dane są oznaczone jako świeże do `fresh_until`.
+
+    Zwraca podsumowanie albo None, gdy `heartbeat()` zgłosił utratę slotu.
+    '''
+    cache = cache or get_default_cache()
+    tickers = prescan_universe()
+    until = fresh_until(config, now)
+    start = time.perf_counter()
+    runs = []
+    for interval in config['intervals']:
+        for period in config['periods']:
+            run_start, fetched, failed = time.perf_counter(), [], 0
+            for t, result in iter_scan(tickers, period=period, interval=interval, cache=cache, result_store=result_store, refresh=True, metrics=metrics):
+                if isinstance(result, FetchFailure): failed += 1
+                else: fetched.append(t)
+                if heartbeat is not None and not heartbeat(): return None
+            cache.mark_fresh(fetched, interval, until)
+            runs.append({'interval': interval, 'period': period, 'tickers': len(fetched), 'failed': failed, 'elapsed_s': round(time.perf_counter() - run_start, 1)})
+    return {
+        'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'fresh_until': time.strftime('%Y-%m-%d %H:%M', time.localtime(until)),
+        'tickers': len(tickers),
+        'elapsed_s': round(time.perf_counter() - start, 1),
+        'runs': runs,
+        'host': socket.gethostname(),
+        'pid': os.getpid()
+    }
+
+def run_due(config=None, now=None, force=False, root=PRESCAN_DIR, cache=None, result_store=None, metrics=None):
+    '''Pre-skan bieżącego terminu, jeśli nikt go jeszcze nie zrobił ani nie robi; zwraca podsumowanie lub None.
+
+    force=True - skan od razu (slot z bieżącą minutą), niezależnie od harmonogramu i `enabled`.
+    '''
+    config = config or load_config()
+    if not force and not config['enabled']: return None
+    # Dane z backendów offline nie trafiają do magazynu, więc nie ma czego rozgrzewać
+    if not get_provider().cacheable: return None
+    slot = slot_id(now or dt.datetime.now()) if force else current_slot(config, now)
+    if slot is None: return None
+    claim = SlotClaim.acquire(slot, root)
+    if claim is None: return None
+    summary = run_prescan(config, cache, result_store, claim.heartbeat, metrics, now)
+    if summary is None: return None
+    claim.release({'slot': slot, **summary})
+    cleanup(root)
+    return summary
+
+# =============================================================================
+# SEKCHJA 4: WORKER W TLE
+# =============================================================================
+
+class PrescanWorker(threading.Thread):
+    '''Wątek demona sprawdzający harmonogram co `poll` s; config czytany przy każdym sprawdzeniu.'''
+
+    def __init__(self, config_path=PRESCAN_CONFIG, poll=POLL_INTERVAL, root=PRESCAN_DIR):
+        super().__init__(name='fibo-prescan', daemon=True)
+        self.config_path = config_path
+        self.poll = poll
+        self.root = root
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                summary = run_due(load_config(self.config_path), root=self.root)
+                if summary: logger.info('Pre-skan: %s tickerów w %.1fs', summary['tickers'], summary['elapsed_s'])
+            except Exception:
+                # Porzucony slot przejmie po CLAIM_TTL ta lub inna instancja
+                logger.exception('Pre-skan nie powiódł się')
+            self._stop_event.wait(self.poll)
+
+    def stop(self):
+        self._stop_event.set()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_prescan_worker():
+    '''Jeden worker na proces (Streamlit wykonuje skrypt przy każdej interakcji); None, gdy wyłączony.'''
+    global _worker
+    if os.environ.get(PRESCAN_ENV) == '0': return None
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = PrescanWorker()
+            _worker.start()
+        return _worker
+
+# =============================================================================
+# SEKCHJA 5: URUCHOMIENIE JAKO OSOBNY PROCES
+# =============================================================================
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m src.prescan', description='FiboLevels AI - pre-skan presetów po zamknięciu sesji.')
+    parser.add_argument('--config', default=PRESCAN_CONFIG, help='Plik harmonogramu JSON (brak = wartości domyślne)')
+    parser.add_argument('--once', action='store_true', help='Jedno sprawdzenie harmonogramu zamiast pętli')
+    parser.add_argument('--force', action='store_true', help='Skanuj od razu, niezależnie od harmonogramu')
+    parser.add_argument('--poll', type=int, default=POLL_INTERVAL, help='Co ile sekund sprawdzać harmonogram')
+    parser.add_argument('--provider', default=None, help='Źródło danych: yahoo | store[:katalog] | replay[:katalog] | synthetic[:seed]')
+    parser.add_argument('--metrics', action='store_true', help='Wypisz czasy etapów po pre-skanie')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.provider: set_provider(args.provider)
+    if not get_provider().cacheable:
+        print('Pre-skan wymaga źródła danych zapisywanego w magazynie (yahoo).', file=sys.stderr)
+        return 1
+    if args.once or args.force:
+        metrics = ScanMetrics(label='pre-skan') if args.metrics else None
+        summary = run_due(load_config(args.config), force=args.force, metrics=metrics)
+        if summary is None:
+            print('Nic do zrobienia (poza harmonogramem, termin już zrobiony lub trwa w innej instancji).')
+            return 0
+        print(json.dumps(summary, indent=4))
+        if metrics is not None: print(metrics.finish().stage_table().to_string(index=False))
+        return 0
+    worker = PrescanWorker(args.config, args.poll)
+    worker.run()  # pętla w wątku głównym; Ctrl+C kończy proces
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+from src.cache import CACHE_DIR, OHLCVCache, PERIOD_OFFSETS, get_default_cache
+from src.fetcher import get_fetch_scheduler
+
+PROVIDER_ENV = 'FIBO_DATA_PROVIDER'
+PROVIDER_NAMES = ['yahoo', 'store', 'replay', 'synthetic']
+
+SYNTHETIC_START = pd.Timestamp('2000-01-03')
+SYNTHETIC_FREQ = {'1d': 'B', '1wk': 'W-MON', '1mo': 'MS'}
+SYNTHETIC_BAR_DAYS = {'1d': 1, '1wk': 5, '1mo': 21}
+
+# =============================================================================
+# SEKCHJA 1: BACKENDY DANYCH
+# =============================================================================
+# Wspólny interfejs: fetch(tickers, period, interval, start, max_workers, metrics) -> ({ticker: df | None}, {ticker: status})
+# `cacheable` = czy wynik wolno zapisywać w magazynie OHLCV (tylko dane rynkowe).
+
+class YahooProvider:
+    '''Yahoo Finance przez wspólny harmonogram (limit tempa, ponowienia).'''
+    name = 'yahoo'
+    cacheable = True
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler
+
+    def fetch(self, tickers, period='2y', interval='1d', start=None, max_workers=None, metrics=None):
+        window = {'start': start} if start is not None else {'period': period}
+        return (self.scheduler or get_fetch_scheduler()).fetch(tickers, max_workers=max_workers, metrics=metrics, interval=interval, **window)
+
+def _window(df, period, start, end):
+    '''Okno danych: od `start` albo `period` wstecz od `end`.'''
+    if start is not None: return df[df.index >= pd.Timestamp(start)]
+    offset = PERIOD_OFFSETS.get(period)
+    return df if offset is None else df[df.index >= end.normalize() - offset]
+
+class StoreProvider:
+    '''Offline: tylko historia zapisana w magazynie OHLCV (domyślnie lokalny cache).
+
+    replay=True przesuwa daty o pełne tygodnie tak, aby nagranie kończyło się w bieżącym tygodniu -
+    stare nagrania przechodzą przez filtry okresów jak świeże dane, dni tygodnia zostają bez zmian.
+    '''
+    name = 'store'
+    cacheable = False
+
+    def __init__(self, root=CACHE_DIR, replay=False):
+        self.store = get_default_cache() if root == CACHE_DIR else OHLCVCache(root)
+        self.replay = replay
+
+    def history(self, ticker, period='2y', interval='1d', start=None):
+        df = self.store.get(ticker, interval)
+        if df is None or df.empty: return None
+        now = pd.Timestamp.now(tz=df.index.tz)
+        if self.replay:
+            weeks = max(0, (now - df.index[-1]).days // 7)
+            df = df.copy()
+            df.index = df.index + pd.Timedelta(weeks=weeks)
+        window = _window(df, period, start, now)
+        return window if not window.empty else None
+
+    def fetch(self, tickers, period='2y', interval='1d', start=None, max_workers=None, metrics=None):
+        frames = {t: self.history(t, period, interval, start) for t in tickers}
+        return frames, {t: 'no_data' for t, df in frames.items() if df is None}
+
+class SyntheticProvider:
+    '''Deterministyczne OHLCV bez sieci: ten sam (seed, ticker, interwał) = te same słupki.
+
+    Seria zaczyna się zawsze w SYNTHETIC_START, więc różne okresy i `start` widzą te same wartości.
+    Trendy przeplatane korektami dają dołki HL i strefy Fibo jak na prawdziwych danych.
+    '''
+    name = 'synthetic'
+    cacheable = False
+
+    def __init__(self, seed=0, end=None):
+        self.seed = seed
+        self.end = pd.Timestamp(end).normalize() if end is not None else pd.Timestamp.now().normalize()
+        self._calendars = {}
+
+    def _calendar(self, interval):
+        # date_range dla dni roboczych jest wolne - jeden kalendarz na interwał
+        if interval not in self._calendars:
+            self._calendars[interval] = pd.date_range(SYNTHETIC_START, self.end, freq=SYNTHETIC_FREQ[interval], name='Date')
+        return self._calendars[interval]
+
+    def history(self, ticker, period='2y', interval='1d', start=None):
+        dates = self._calendar(interval)
+        n = len(dates)
+        if n == 0: return None
+        rng = np.random.default_rng([self.seed, zlib.crc32(ticker.encode()), list(SYNTHETIC_FREQ).index(interval)])
+        bar_scale = np.sqrt(SYNTHETIC_BAR_DAYS[interval])
+
+        # Reżimy: losowej długości odcinki z dryfem dodatnim lub ujemnym
+        drift, vol = rng.normal(0.0004, 0.0003), rng.uniform(0.012, 0.03)
+        regime_len = rng.integers(20, 120, size=n // 20 + 1)
+        regime_drift = rng.normal(drift, 0.0025, size=len(regime_len))
+        bar_drift = np.repeat(regime_drift, regime_len)[:n] * SYNTHETIC_BAR_DAYS[interval]
+        returns = bar_drift + rng.standard_normal(n) * vol * bar_scale
+
+        # Poziom ceny kotwiczony na końcu serii - ostatnie lata zawsze w realistycznym zakresie
+        log_path = np.cumsum(returns)
+        close = rng.uniform(10, 500) * np.exp(log_path - log_path[-1])
+        prev_close = np.concatenate([[close[0]], close[:-1]])
+        open_ = prev_close * np.exp(rng.standard_normal(n) * vol * bar_scale / 4)
+        wick = np.abs(rng.standard_normal((2, n))) * vol * bar_scale / 2
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        volume = np.round(rng.lognormal(13, 0.5) * np.exp(rng.standard_normal(n) * 0.4 + np.abs(returns) / vol * 0.3))
+
+        df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=dates)
+        return _window(df, period, start, self.end)
+
+    def fetch(self, tickers, period='2y', interval='1d', start=None, max_workers=None, metrics=None):
+        return {t: self.history(t, period, interval, start) for t in tickers}, {}
+
+# =============================================================================
+# SEKCHJA 2: WYBÓR BACKENDU DLA PROCESU
+# =============================================================================
+
+def make_provider(spec):
+    '''"yahoo" | "store[:katalog]" | "replay[:katalog]" | "synthetic[:seed]" -> backend.'''
+    name, _, arg = (spec or 'yahoo').partition(':')
+    if name == 'yahoo': return YahooProvider()
+    if name in ('store', 'replay'): return StoreProvider(arg or CACHE_DIR, replay=name == 'replay')
+    if name == 'synthetic': return SyntheticProvider(int(arg or 0))
+    raise ValueError(f"Nieznany dostawca danych: {spec} (dostępne: {', '.join(PROVIDER_NAMES)})")
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider():
+    '''Backend procesu; domyślnie z FIBO_DATA_PROVIDER, a bez niej Yahoo.'''
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = make_provider(os.environ.get(PROVIDER_ENV))
+        return _provider
+
+def set_provider(provider):
+    '''Ustawia backend (obiekt lub specyfikację tekstową) dla całego procesu.'''
+    global _provider
+    with _provider_lock:
+        _provider = make_provider(provider) if isinstance(provider, str) or provider is None else provider
+        return _provider
@@ -0,0 +1,112 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+from src.cache import CACHE_DIR
+
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL = 6 * 3600
+RESULTS_DIR = os.path.join(CACHE_DIR, 'results')
+# Na dysku wynik ważny dłużej - klucz i tak zawiera ostatni słupek, a pre-skan z piątku ma przetrwać weekend
+DISK_TTL = 4 * 24 * 3600
+
+# =============================================================================
+# SEKCHJA 1: MAGAZYN WYNIKÓW ANALIZY (LRU + TTL)
+# =============================================================================
+
+def result_key(ticker, period, interval, last_ts):
+    '''Wynik zależy tylko od danych do ostatniego słupka - ten sam słupek = ten sam wynik.'''
+    return (ticker, period, interval, str(last_ts))
+
+class ResultStore:
+    '''Współdzielony w procesie magazyn wyników (ticker, ScanResult) z eksmisją LRU i wygasaniem TTL.
+
+    Z `root` każdy wynik trafia też na dysk (ostatni na (ticker, okres, interwał)) - wyniki pre-skanu
+    z innego procesu lub instancji aplikacji są widoczne od razu.
+    '''
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, root=None, disk_ttl=DISK_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.root = root
+        self.disk_ttl = disk_ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        ticker, period, interval, _ = key
+        return os.path.join(self.root, interval, period, f"{quote(ticker, safe='')}.pkl")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                stored_key, stored_at, value = pickle.load(f)
+        except Exception:
+            return None
+        if stored_key != key or time.time() - stored_at > self.disk_ttl: return None
+        return stored_at, value
+
+    def _save(self, key, stored_at, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, stored_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.time() - item[0] > self.ttl:
+                del self._items[key]
+                item = None
+            if item is not None:
+                self._items.move_to_end(key)
+                return item[1]
+        if self.root is None: return None
+        item = self._load(key)
+        if item is None: return None
+        with self._lock:
+            self._items[key] = (time.time(), item[1])
+            self._items.move_to_end(key)
+        return item[1]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._items[key] = (now, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        if self.root is not None:
+            try:
+                self._save(key, now, value)
+            except OSError:
+                pass  # Dysk tylko jako drugi poziom - wynik został w pamięci
+
+    def invalidate(self, ticker=None):
+        with self._lock:
+            for key in [k for k in self._items if ticker is None or k[0] == ticker]:
+                del self._items[key]
+        if self.root is None or not os.path.isdir(self.root): return
+        name = None if ticker is None else f"{quote(ticker, safe='')}.pkl"
+        for dirpath, _, files in os.walk(self.root):
+            for f in files:
+                if name is None or f == name: os.remove(os.path.join(dirpath, f))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_result_store():
+    '''Jedna instancja na proces - wspólna dla wszystkich sesji Streamlit.'''
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ResultStore(root=RESULTS_DIR)
+        return _default_store
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.data_provider import load_timeframes, analyze_ticker_data
+from src.indicators import ticker_values
+from src.structure_state import get_default_state_store
+from src.cache import get_default_cache
+from src.result_store import get_result_store, result_key
+from src.models import FetchFailure
+from src.providers import get_provider
+from src.metrics import count, timed
+
+# =============================================================================
+# SEKCHJA 1: KONFIGURACJA SILNIKA SKANOWANIA
+# =============================================================================
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_BATCH_SIZE = 25
+# Analiza (NumPy/pandas) trzyma GIL - wątki tylko nakładają ją na pobieranie kolejnej paczki,
+# więcej niż dwa dokłada jedynie rywalizację o GIL. Równoległa analiza na rdzeniach: cli (pula procesów).
+ANALYSIS_THREADS = 2
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _unique(tickers):
+    '''Usuwa duplikaty z zachowaniem kolejności.'''
+    return list(dict.fromkeys(tickers))
+
+# =============================================================================
+# SEKCHJA 2: POBIERANIE WSADOWE (BATCH + PULA WĄTKÓW)
+# =============================================================================
+
+def _download_chunk(chunk, period, interval, max_workers, cache=None, refresh=False, errors=None, metrics=None):
+    '''Jedna paczka przez harmonogram pobierania (ponowienia i limit tempa są w nim).'''
+    try:
+        frames = load_timeframes(chunk, period=period, interval=interval, threads=max_workers, cache=cache, refresh=refresh, errors=errors, metrics=metrics)
+    except Exception:
+        frames = {}
+        if errors is not None: errors.update({t: 'error' for t in chunk})
+    return {t: frames.get(t, (None, None)) for t in chunk}
+
+def iter_downloads(tickers, period='2y', interval='1d', max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, cache=None, refresh=False, errors=None, metrics=None):
+    '''Zwraca kolejne paczki {ticker: (dane, dane_tygodniowe)}; `errors` <- {ticker: status błędu pobrania}.'''
+    for chunk in _chunks(_unique(tickers), batch_size):
+        yield _download_chunk(chunk, period, interval, max_workers, cache, refresh, errors, metrics)
+
+# =============================================================================
+# SEKCHJA 3: ANALIZA W TLE POBIERANIA
+# =============================================================================
+
+def chunk_values(frames, metrics=None):
+    '''Wartości końcowe FA-45..FA-48 dla całej pobranej paczki jednym przebiegiem panelowym: {ticker: {nazwa: wartość}}.'''
+    with timed(metrics, 'features'):
+        return ticker_values({t: data for t, (data, _) in frames.items()})
+
+def _analyze(ticker, data, w_data, period, interval, states, result_store, metrics=None, values=None):
+    result = analyze_ticker_data(ticker, data, w_data, interval, states, metrics, values)
+    if not data.empty: result_store.put(result_key(ticker, period, interval, data.index[-1]), result)
+    return result
+
+def _stored_result(ticker, period, interval, cache, result_store):
+    '''Gotowy wynik, jeśli dane w magazynie są świeże, a ostatni słupek był już analizowany.'''
+    if not cache.is_fresh(ticker, interval): return None
+    last_ts = cache.meta(ticker, interval).get('last_ts')
+    return result_store.get(result_key(ticker, period, interval, last_ts)) if last_ts else None
+
+def iter_scan(tickers, period='2y', interval='1d', max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, cache=None, states=None, result_store=None, refresh=False, metrics=None):
+    '''Zwraca wyniki (ticker, ScanResult | FetchFailure | None) w kolejności ukończenia; refresh=True wymusza pobranie.
+
+    `max_workers` dotyczy pobierania; analiza idzie w ANALYSIS_THREADS wątkach równolegle z nim.
+    '''
+    cache = cache or get_default_cache()
+    states = states or get_default_state_store()
+    result_store = result_store or get_result_store()
+
+    tickers = _unique(tickers)
+    # Zapamiętane wyniki dotyczą danych z magazynu - nie dla backendów offline
+    if not refresh and get_provider().cacheable:
+        remaining = []
+        for t in tickers:
+            stored = _stored_result(t, period, interval, cache, result_store)
+            if stored is not None: yield stored
+            else: remaining.append(t)
+        count(metrics, 'result_hit', len(tickers) - len(remaining))
+        tickers = remaining
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, ANALYSIS_THREADS)) as pool:
+        pending = []
+        for frames in iter_downloads(tickers, period, interval, max_workers, batch_size, cache, refresh, errors, metrics):
+            values = chunk_values(frames, metrics)
+            for t, (data, w_data) in frames.items():
+                # Brak danych to nie odrzucenie przez filtry - osobny status, bez zapisu w magazynie wyników
+                if data is None or data.empty: yield t, FetchFailure(t, errors.get(t, 'no_data'))
+                else: pending.append(pool.submit(_analyze, t, data, w_data, period, interval, states, result_store, metrics, values.get(t)))
+            # Wyniki gotowe w trakcie pobierania kolejnej paczki oddajemy od razu
+            still_pending = []
+            for f in pending:
+                if f.done(): yield f.result()
+                else: still_pending.append(f)
+            pending = still_pending
+        for f in as_completed(pending):
+            yield f.result()
+
+def scan_tickers(tickers, period='2y', interval='1d', max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, cache=None, states=None, result_store=None, refresh=False, metrics=None):
+    '''Skanuje listę tickerów; zwraca {ticker: (ticker, ScanResult | None)} w kolejności wejścia.'''
+    order = _unique(tickers)
+    results = {t: (t, None) for t in order}
+    for ticker, result in iter_scan(order, period, interval, max_workers, batch_size, cache, states, result_store, refresh, metrics):
+        results[ticker] = (ticker, result)
+    return results
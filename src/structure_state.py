@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pickle
+import threading
+from urllib.parse import quote
+import numpy as np
+from src import analyzer
+from src.analyzer import HH_WINDOW, SEARCH_WINDOW, structure_span, find_all_significant_lows, cluster_levels
+from src.cache import CACHE_DIR
+from src.metrics import timed, count
+
+STATE_DIR = os.path.join(CACHE_DIR, 'structure')
+STATE_VERSION = 1  # Zmiana algorytmu struktury/klastrów lub formatu stanu = podbicie wersji
+
+# =============================================================================
+# SEKCHJA 1: KLUCZ ZALEŻNOŚCI STRUKTURY
+# =============================================================================
+
+def structure_params():
+    '''Parametry dołków i klastrów (czytane przy każdym wywołaniu) - ich zmiana unieważnia zapisane stany.'''
+    return (
+        STATE_VERSION,
+        tuple(sorted(analyzer.FIB_RATIOS.items())),
+        analyzer.CLUSTER_TOLERANCE,
+        analyzer.ZONE_TOLERANCE,
+        analyzer.SWING_HALF_WINDOW,
+        analyzer.RECENT_HIGH_WINDOW,
+        analyzer.FUTURE_WINDOW,
+        analyzer.MA_WINDOW
+    )
+
+def structure_key(df, hh_window=HH_WINDOW, search_window=SEARCH_WINDOW):
+    '''Odcisk wszystkiego, od czego zależy struktura: parametry, pozycja HH w oknie i słupki przed nią.'''
+    hh_pos, start, end = structure_span(df, hh_window, search_window)
+    window = df.iloc[start:end]
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(window.index.asi8.tobytes() if hasattr(window.index, 'asi8') else str(list(window.index)).encode())
+    for column in ('High', 'Low', 'Volume'):
+        digest.update(np.ascontiguousarray(window[column].to_numpy(dtype=float)).tobytes())
+    # start == 0: średnie kroczące zaczynają się od początku danych (NaN na starcie)
+    return (structure_params(), hh_window, search_window, df.index[hh_pos], start == 0, hh_pos - start, end - start, digest.hexdigest())
+
+def incremental_structure(df, state=None, hh_window=HH_WINDOW, search_window=SEARCH_WINDOW, metrics=None, ticker=None):
+    '''Zwraca (struktura, ZoneSet, stan); pełne przeliczenie tylko gdy zmienił się klucz zależności.'''
+    if df is None or len(df) < hh_window: return None, None, None
+    key = structure_key(df, hh_window, search_window)
+    if state is None or state['key'] != key:
+        with timed(metrics, 'structure', ticker):
+            struct = find_all_significant_lows(df, hh_window, search_window)
+        zone_set = None
+        if struct:
+            with timed(metrics, 'clustering', ticker):
+                zone_set = cluster_levels(struct)
+        state = {'key': key, 'struct': struct, 'zone_set': zone_set}
+    else:
+        count(metrics, 'structure_reuse')
+    # Kopia płytka - wywołujący mogą dopisywać klucze, stan ma pozostać czysty
+    struct = dict(state['struct']) if state['struct'] else None
+    return struct, state['zone_set'], state
+
+# =============================================================================
+# SEKCHJA 2: MAGAZYN STANÓW (PAMIĘĆ + PICKLE NA DYSKU)
+# =============================================================================
+
+class StructureStore:
+    '''Stan struktury per (ticker, interwał) z zapisem na dysk.'''
+
+    def __init__(self, root=STATE_DIR):
+        self.root = root
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker, interval):
+        return os.path.join(self.root, interval, f"{quote(ticker, safe='')}.pkl")
+
+    def get(self, ticker, interval):
+        with self._lock:
+            if (ticker, interval) in self._mem: return self._mem[(ticker, interval)]
+        path = self._path(ticker, interval)
+        if not os.path.exists(path): return None
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception:
+            return None
+        with self._lock:
+            self._mem[(ticker, interval)] = state
+        return state
+
+    def put(self, ticker, interval, state):
+        path = self._path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._mem[(ticker, interval)] = state
+
+    def invalidate(self, ticker=None, interval=None):
+        with self._lock:
+            for key in [k for k in self._mem if (ticker is None or k[0] == ticker) and (interval is None or k[1] == interval)]:
+                self._mem.pop(key)
+        if not os.path.isdir(self.root): return
+        for k_interval in os.listdir(self.root):
+            if interval is not None and k_interval != interval: continue
+            for name in os.listdir(os.path.join(self.root, k_interval)):
+                if ticker is None or name == f"{quote(ticker, safe='')}.pkl":
+                    os.remove(os.path.join(self.root, k_interval, name))
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_default_state_store():
+    '''Współdzielona instancja magazynu stanów dla procesu.'''
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = StructureStore()
+        return _default_store
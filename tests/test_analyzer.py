@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.analyzer import find_all_significant_lows
+
+# =============================================================================
+# SEKCHJA 1: IMPLEMENTACJA REFERENCYJNA (PĘTLA SPRZED WEKTORYZACJI)
+# =============================================================================
+
+def baseline_significant_lows(df):
+    '''Kopia pętli .iloc sprzed wektoryzacji - wzorzec równoważności.'''
+    if df is None or len(df) < 252: return None
+
+    df = df.copy()
+    df['Vol_MA20'] = df['Volume'].rolling(20).mean()
+    df['Price_Range'] = df['High'] - df['Low']
+    df['Effort_Ratio'] = df['Volume'] / df['Price_Range'].replace(0, np.nan)
+    df['Eff_MA20'] = df['Effort_Ratio'].rolling(20).mean()
+
+    yearly_df = df.tail(252)
+    hh_val = float(yearly_df['High'].max())
+    hh_idx = yearly_df['High'].idxmax()
+    hh_pos = df.index.get_loc(hh_idx)
+
+    search_start = max(0, hh_pos - 252)
+    candidates = []
+
+    for i in range(search_start + 8, hh_pos - 5):
+        low_val = float(df['Low'].iloc[i])
+        if low_val == df['Low'].iloc[i-8:i+9].min():
+            v_score = 1.0
+            if df['Volume'].iloc[i] > df['Vol_MA20'].iloc[i] * 1.5: v_score += 1.0
+            if df['Effort_Ratio'].iloc[i] > df['Eff_MA20'].iloc[i] * 2.0: v_score += 1.0
+
+            recent_high = df['High'].iloc[i-15:i].max()
+            future_window = df.iloc[i:min(i+35, hh_pos)]
+            if not future_window.empty:
+                if future_window['High'].max() > recent_high or (future_window['High'].max() - low_val) / low_val > 0.09:
+                    candidates.append({'date': df.index[i], 'price': low_val, 'score': v_score})
+
+    if not candidates: return None
+
+    final_hls = []
+    for c in sorted(candidates, key=lambda x: x['date']):
+        final_hls = [h for h in final_hls if h['price'] < c['price']]
+        if not final_hls or (c['date'] - final_hls[-1]['date']).days > 20:
+            final_hls.append(c)
+        else:
+            if c['price'] < final_hls[-1]['price']: final_hls[-1] = c
+
+    significant_lows = [l for l in final_hls if (hh_val - l['price']) / l['price'] >= 0.10]
+    return {'hh': {'date': hh_idx, 'price': hh_val}, 'hls': significant_lows}
+
+# =============================================================================
+# SEKCHJA 2: DANE TESTOWE
+# =============================================================================
+
+def make_ohlcv(seed, n=600, vol=0.02):
+    '''Błądzenie losowe OHLCV na dniach sesyjnych.'''
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    spread = np.abs(rng.normal(0, vol / 2, n)) * close
+    return pd.DataFrame({
+        'Open': close,
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1_000, 100_000, n).astype(float)
+    }, index=pd.bdate_range('2020-01-01', periods=n))
+
+def with_nan_bars(df, seed):
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    for column in ('Low', 'High', 'Volume'):
+        df.loc[df.index[rng.choice(len(df), 15, replace=False)], column] = np.nan
+    return df
+
+def with_zero_ranges(df, seed):
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    rows = df.index[rng.choice(len(df), 40, replace=False)]
+    df.loc[rows, 'High'] = df.loc[rows, 'Low']
+    return df
+
+def with_tied_lows(df):
+    '''Ceny na grubej siatce - wiele równych minimów w oknie dołka.'''
+    df = df.copy()
+    df['Low'] = (df['Low'] / 2).round() * 2
+    df['High'] = np.maximum(df['High'], df['Low'])
+    return df
+
+def with_early_hh(df, offset):
+    '''Najwyższy szczyt `offset` słupków po początku okna HH (252 ostatnich).'''
+    df = df.copy()
+    df.iloc[len(df) - 252 + offset, df.columns.get_loc('High')] = df['High'].max() * 1.5
+    return df
+
+CASES = (
+    [(f'random-{s}', make_ohlcv(s)) for s in range(20)]
+    + [(f'short-{s}', make_ohlcv(s, n=270)) for s in range(5)]
+    + [(f'nan-{s}', with_nan_bars(make_ohlcv(100 + s), s)) for s in range(10)]
+    + [(f'zero-range-{s}', with_zero_ranges(make_ohlcv(200 + s), s)) for s in range(10)]
+    + [(f'ties-{s}', with_tied_lows(make_ohlcv(300 + s))) for s in range(10)]
+    + [(f'early-hh-{o}', with_early_hh(make_ohlcv(400 + o), o)) for o in (0, 1, 3, 8, 20)]
+)
+
+# =============================================================================
+# SEKCHJA 3: RÓWNOWAŻNOŚĆ
+# =============================================================================
+
+@pytest.mark.parametrize('name, df', CASES, ids=[name for name, _ in CASES])
+def test_matches_baseline_loop(name, df):
+    assert find_all_significant_lows(df) == baseline_significant_lows(df)
+
+def test_cases_find_structure():
+    '''Zestaw danych faktycznie zawiera dołki - inaczej równość None == None niczego nie sprawdza.'''
+    found = [baseline_significant_lows(df) for _, df in CASES]
+    assert sum(r is not None and len(r['hls']) > 0 for r in found) >= len(CASES) // 2
+
+def test_too_short_history():
+    assert find_all_significant_lows(make_ohlcv(0, n=200)) is None
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.commentary import CommentaryCache, comment_results, MODEL_PRICES, DEFAULT_MODEL
+from src.components_html import classify_result
+from src.data_provider import analyze_ticker_data, resample_ohlcv
+from src.providers import SyntheticProvider
+
+# =============================================================================
+# SEKCHJA 1: ZASTĘPCZY SERWER OPENAI I WYNIKI SKANU
+# =============================================================================
+
+USAGE = {'prompt_tokens': 1000, 'completion_tokens': 200, 'total_tokens': 1200, 'prompt_tokens_details': {'cached_tokens': 400}}
+RESPONSE_DELAY = 0.1
+N_TICKERS = 12
+
+class ChatStub(BaseHTTPRequestHandler):
+    '''POST /v1/chat/completions: komentarz dla każdego tickera z wejścia (poza `server.skip`), stałe usage.'''
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        tickers = list(json.loads(body['messages'][-1]['content']))
+        with self.server.lock:
+            self.server.batches.append(tickers)
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        # Opóźnienie, żeby równoległe zapytania faktycznie się nakładały
+        time.sleep(RESPONSE_DELAY)
+        with self.server.lock:
+            self.server.active -= 1
+        texts = {t: f'Cena nad strefą <b>{t}</b>.' for t in tickers if t not in self.server.skip}
+        payload = json.dumps({
+            'id': 'chatcmpl-test',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': json.dumps(texts)}}],
+            'usage': USAGE
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ChatStub)
+    httpd.daemon_threads = True
+    httpd.lock, httpd.batches, httpd.active, httpd.peak, httpd.skip = threading.Lock(), [], 0, 0, set()
+    httpd.base_url = f'http://127.0.0.1:{httpd.server_address[1]}/v1'
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(scope='module')
+def results():
+    '''Wyniki skanu ze strefą główną (dane syntetyczne, stały koniec serii).'''
+    provider = SyntheticProvider(seed=1, end='2025-12-31')
+    found = {}
+    for i in range(100):
+        ticker = f'SYN{i:03d}'
+        data = provider.history(ticker, '5y')
+        _, result = analyze_ticker_data(ticker, data, resample_ohlcv(data, '1wk'), '1d')
+        if result is not None and result.main_zone is not None: found[ticker] = result
+        if len(found) == N_TICKERS: return found
+    pytest.fail('za mało wyników ze strefą w danych syntetycznych')
+
+def run(server, results, cache, **kwargs):
+    return comment_results(results, api_key='test', base_url=server.base_url, cache=cache, **kwargs)
+
+def expected_cost(requests):
+    price_in, price_cached, price_out = MODEL_PRICES[DEFAULT_MODEL]
+    cached = USAGE['prompt_tokens_details']['cached_tokens']
+    return requests * ((USAGE['prompt_tokens'] - cached) * price_in + cached * price_cached + USAGE['completion_tokens'] * price_out) / 1e6
+
+# =============================================================================
+# SEKCHJA 2: TESTY
+# =============================================================================
+
+def test_batches_concurrency_and_cost(server, results, tmp_path):
+    outcome = run(server, results, CommentaryCache(tmp_path), batch_size=3, concurrency=2)
+    assert sorted(outcome.texts) == sorted(results)
+    assert outcome.requests == len(server.batches) == 4
+    assert sorted(t for batch in server.batches for t in batch) == sorted(results)
+    assert 1 < server.peak <= 2
+    assert outcome.cost == pytest.approx(expected_cost(4))
+    assert (outcome.prompt_tokens, outcome.completion_tokens) == (4000, 800)
+    assert not outcome.failed and not outcome.errors
+
+def test_second_run_is_fully_cached(server, results, tmp_path):
+    run(server, results, CommentaryCache(tmp_path), batch_size=5)
+    sent = len(server.batches)
+    # Nowa instancja = pusta pamięć, komentarze tylko z plików na dysku
+    again = run(server, results, CommentaryCache(tmp_path), batch_size=5)
+    assert len(server.batches) == sent
+    assert (again.cached, again.requests, again.cost) == (N_TICKERS, 0, 0.0)
+    assert len(again.texts) == N_TICKERS
+
+def test_cached_only_sends_nothing(server, results, tmp_path):
+    outcome = run(server, results, CommentaryCache(tmp_path), cached_only=True)
+    assert not server.batches and not outcome.texts and outcome.cost == 0.0
+
+def test_missing_comment_is_failed_and_not_cached(server, results, tmp_path):
+    skipped = next(iter(results))
+    server.skip.add(skipped)
+    outcome = run(server, results, CommentaryCache(tmp_path), batch_size=4)
+    assert outcome.failed == [skipped] and skipped not in outcome.texts
+    server.skip.clear()
+    retry = run(server, results, CommentaryCache(tmp_path), batch_size=4)
+    assert (retry.cached, retry.requests) == (N_TICKERS - 1, 1)
+    assert server.batches[-1] == [skipped]
+
+def test_comment_is_escaped_on_card(server, results, tmp_path):
+    texts = run(server, results, CommentaryCache(tmp_path)).texts
+    ticker = next(t for t in results if classify_result(t, results[t], '1d', 0.0)[0] == 'card')
+    _, card, _ = classify_result(ticker, results[ticker], '1d', 0.0, commentary=texts)
+    comment = next(line for line in card['ai_desc'] if line.startswith('🤖'))
+    assert '&lt;b&gt;' in comment and '<b>' not in comment
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+import requests
+from src import fetcher
+from src.fetcher import FetchScheduler, TokenBucket, default_rate, RATE_ENV
+from src.metrics import ScanMetrics
+
+# =============================================================================
+# SEKCHJA 1: SERWER ZASTĘPCZY
+# =============================================================================
+
+BARS = {'Open': [1.0, 2.0], 'High': [1.5, 2.5], 'Low': [0.5, 1.5], 'Close': [1.2, 2.2], 'Volume': [100, 200]}
+SLOW_SECONDS = 0.5
+
+class StandIn(BaseHTTPRequestHandler):
+    '''GET /<ticker>: scenariusz z `script` serwera (lista odpowiedzi zużywana po kolei, ostatnia się powtarza).'''
+
+    def do_GET(self):
+        ticker = self.path.strip('/')
+        with self.server.lock:
+            self.server.hits[ticker] = self.server.hits.get(ticker, 0) + 1
+            steps = self.server.script.get(ticker, ['ok'])
+            step = steps.pop(0) if len(steps) > 1 else steps[0]
+        if step == 'slow': time.sleep(SLOW_SECONDS)
+        if step == 'missing': return self._send(404, b'{}')
+        if isinstance(step, tuple): return self._send(429, b'{}', {'Retry-After': step[1]})
+        self._send(200, json.dumps(BARS).encode())
+
+    def _send(self, code, body, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    httpd.daemon_threads = True
+    httpd.lock, httpd.hits, httpd.script = threading.Lock(), {}, {}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def http_history(ticker, session=None, base_url=None, timeout=0.2, **window):
+    '''fetch_one jak yahoo_history: błędy HTTP jako wyjątki z `response`, 404 = brak tickera.'''
+    response = session.get(f'{base_url}/{ticker}', timeout=timeout)
+    if response.status_code == 404: return None
+    response.raise_for_status()
+    return pd.DataFrame(response.json(), index=pd.bdate_range('2024-01-01', periods=2))
+
+def make_scheduler(httpd, **kwargs):
+    base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    kwargs = dict({'rate': 100.0, 'burst': 100, 'max_retries': 2, 'backoff_base': 0.01}, **kwargs)
+    return FetchScheduler(partial(http_history, base_url=base_url), session=requests.Session(), **kwargs)
+
+# =============================================================================
+# SEKCHJA 2: TESTY
+# =============================================================================
+
+def test_retries_after_429_and_honours_retry_after(server):
+    server.script['AAA'] = [('429', '0.3'), ('429', '0.3'), 'ok']
+    metrics = ScanMetrics()
+    start = time.perf_counter()
+    data, status = make_scheduler(server).fetch_ticker('AAA', metrics)
+    assert status is None and len(data) == 2
+    assert server.hits['AAA'] == 3
+    assert metrics.counters['retries'] == 2
+    assert time.perf_counter() - start >= 0.6
+
+def test_429_halves_concurrency_limit(server):
+    server.script['AAA'] = [('429', '0'), 'ok']
+    scheduler = make_scheduler(server, concurrency=8)
+    scheduler.fetch_ticker('AAA')
+    assert scheduler.limit.limit < 8
+
+def test_retry_after_is_capped(server, monkeypatch):
+    monkeypatch.setattr(fetcher, 'BACKOFF_MAX', 0.2)
+    server.script['AAA'] = [('429', '3600'), 'ok']
+    start = time.perf_counter()
+    data, status = make_scheduler(server).fetch_ticker('AAA')
+    assert status is None
+    assert time.perf_counter() - start < 2
+
+def test_timeout_is_retried_then_reported(server):
+    server.script['SLOW'] = ['slow']
+    data, status = make_scheduler(server, max_retries=1).fetch_ticker('SLOW')
+    assert (data, status) == (None, 'timeout')
+    assert server.hits['SLOW'] == 2
+
+def test_fetch_reports_status_per_ticker(server):
+    server.script.update({'LIMITED': [('429', '0.1')], 'SLOW': ['slow'], 'GONE': ['missing'], 'FLAKY': [('429', '0.1'), 'ok']})
+    frames, errors = make_scheduler(server, max_retries=1).fetch(['OK', 'LIMITED', 'SLOW', 'GONE', 'FLAKY'], max_workers=4)
+    assert errors == {'LIMITED': 'rate_limited', 'SLOW': 'timeout', 'GONE': 'no_data'}
+    assert frames['OK'] is not None and frames['FLAKY'] is not None
+    assert server.hits['GONE'] == 1
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=1.0, burst=1)
+    bucket.acquire()
+    bucket.set_rate(20.0)
+    start = time.perf_counter()
+    for _ in range(5):
+        bucket.acquire()
+    assert 0.15 < time.perf_counter() - start < 1.0
+
+def test_rate_from_environment(monkeypatch):
+    monkeypatch.setenv(RATE_ENV, '2.5')
+    assert default_rate() == 2.5
+    monkeypatch.delenv(RATE_ENV)
+    assert default_rate() == fetcher.DEFAULT_RATE
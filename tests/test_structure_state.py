@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src import analyzer
+from src.analyzer import find_all_significant_lows, cluster_levels
+from src.structure_state import incremental_structure, structure_key
+
+# =============================================================================
+# SEKCHJA 1: DANE I PORÓWNANIE Z PEŁNYM PRZELICZENIEM
+# =============================================================================
+
+def make_ohlcv(seed, n=900, vol=0.02):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    spread = np.abs(rng.normal(0, vol / 2, n)) * close
+    return pd.DataFrame({
+        'Open': close,
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1_000, 100_000, n).astype(float)
+    }, index=pd.bdate_range('2020-01-01', periods=n))
+
+def assert_same_zones(actual, expected):
+    assert (actual is None) == (expected is None)
+    if expected is None: return
+    assert actual.zones.keys() == expected.zones.keys()
+    for name in expected.zones:
+        np.testing.assert_array_equal(actual.zones[name], expected.zones[name])
+    np.testing.assert_array_equal(actual.hl_price, expected.hl_price)
+
+def walk_bars(df, first, state=None):
+    '''Symulacja kolejnych skanów: co słupek nowe dane, stan przenoszony z poprzedniego kroku.'''
+    reused = 0
+    for end in range(first, len(df) + 1):
+        window = df.iloc[:end]
+        struct, zone_set, new_state = incremental_structure(window, state)
+        reused += new_state is state
+        state = new_state
+        expected = find_all_significant_lows(window)
+        assert struct == expected, f'struktura różna po {end} słupkach'
+        assert_same_zones(zone_set, cluster_levels(expected) if expected else None)
+    return reused
+
+# =============================================================================
+# SEKCHJA 2: TESTY
+# =============================================================================
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_bar_by_bar_equals_full_recompute(seed):
+    df = make_ohlcv(seed)
+    reused = walk_bars(df, first=300)
+    # Bez ponownego użycia stanu test niczego by nie sprawdzał
+    assert reused > 0
+
+def test_revised_last_bar_equals_full_recompute():
+    '''Niepełny ostatni słupek nadpisany wartością końcową (jak dociągnięcie z magazynu).'''
+    df = make_ohlcv(4)
+    state = None
+    for end in range(400, 700):
+        partial = df.iloc[:end].copy()
+        partial.iloc[-1, partial.columns.get_loc('Low')] *= 0.97
+        _, _, state = incremental_structure(partial, state)
+        struct, zone_set, state = incremental_structure(df.iloc[:end], state)
+        expected = find_all_significant_lows(df.iloc[:end])
+        assert struct == expected
+        assert_same_zones(zone_set, cluster_levels(expected) if expected else None)
+
+def test_parameters_change_key(monkeypatch):
+    df = make_ohlcv(5)
+    key = structure_key(df)
+    monkeypatch.setattr(analyzer, 'ZONE_TOLERANCE', analyzer.ZONE_TOLERANCE * 2)
+    assert structure_key(df) != key